@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+import pygame
+from game import Game, init_headless
+from scripts.levelgen import generate_level
+from scripts.utils import save_json
+
+# Generated levels of the benchmark matrix, from about the size of the shipped maps up to far larger ones
+LEVEL_SIZES = {
+    'small': {'tiles': 400, 'decor': 0.1, 'trees': 4, 'enemies': 4},
+    'medium': {'tiles': 2000, 'decor': 0.1, 'trees': 16, 'enemies': 16},
+    'large': {'tiles': 10000, 'decor': 0.1, 'trees': 64, 'enemies': 64},
+    'huge': {'tiles': 50000, 'decor': 0.1, 'trees': 256, 'enemies': 256}
+}
+# Stages timed separately. load_map runs once per measurement before the frames, reload whenever a death or a cleared level reloads the map during update,
+# and the rest every frame.
+STAGES = ['load_map', 'reload', 'update', 'record', 'draw']
+FRAME_STAGES = ['update', 'record', 'draw']
+
+# Commit being measured, so result files can be told apart
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Random but repeatable player input, so the player moves around, jumps and dashes into enemies
+def drive(game, rng):
+    if rng.random() < 0.02:
+        game.movement = [rng.random() < 0.5, rng.random() < 0.5]
+    if rng.random() < 0.03:
+        game.player.jump()
+    if rng.random() < 0.01:
+        game.player.dash()
+
+# Replace game.load_map with a wrapper that appends the duration or, when tracing, the peak allocation of every call to reloads.
+# Returns the original method, for loads that should not count as reloads.
+def track_reloads(game, reloads):
+    load_map = game.load_map
+
+    def reload(map_id=0):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            load_map(map_id)
+            reloads.append(tracemalloc.get_traced_memory()[1] - start)
+        else:
+            start = time.perf_counter()
+            load_map(map_id)
+            reloads.append(time.perf_counter() - start)
+
+    game.load_map = reload
+    return load_map
+
+# Run each stage of a frame and return its duration or, when tracing, its peak allocation above the memory in use when it started.
+# A map reload during update is returned as its own reload stage, so its cost, which grows with the level, does not skew the update numbers.
+def run_frame(game, rng, trace, reloads):
+    results = {}
+    for stage in FRAME_STAGES:
+        reload_count = len(reloads)
+        if trace:
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+        else:
+            start = time.perf_counter()
+        if stage == 'update':
+            drive(game, rng)
+            game.update()
+        elif stage == 'record':
+            snapshot = game.record_frame()
+        else:
+            game.draw_frame(snapshot)
+        if trace:
+            results[stage] = tracemalloc.get_traced_memory()[1] - start
+        else:
+            results[stage] = time.perf_counter() - start
+        if len(reloads) > reload_count:
+            results['reload'] = reloads[-1]
+            if trace:
+                # The reload reset the peak, so this frame's update has no peak of its own
+                del results[stage]
+            else:
+                results[stage] -= results['reload']
+    return results
+
+# Time and trace the stages of a Game playing one generated level
+def measure(level, frames, memory_frames, assets, sfx, seed=0):
+    random.seed(seed)
+    rng = random.Random(seed)
+    game = Game(assets=assets, sfx=sfx, maps=[level])
+    stages = {stage: {'times': [], 'peak': 0} for stage in STAGES}
+    reloads = []
+    load_map = track_reloads(game, reloads)
+
+    start = time.perf_counter()
+    load_map(0)
+    stages['load_map']['times'].append(time.perf_counter() - start)
+    for i in range(frames):
+        for stage, duration in run_frame(game, rng, False, reloads).items():
+            stages[stage]['times'].append(duration)
+
+    # Tracing slows everything down a lot, so memory is measured in a separate, shorter pass
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = tracemalloc.get_traced_memory()[0]
+    load_map(0)
+    stages['load_map']['peak'] = tracemalloc.get_traced_memory()[1] - start
+    for i in range(memory_frames):
+        for stage, peak in run_frame(game, rng, True, reloads).items():
+            stages[stage]['peak'] = max(stages[stage]['peak'], peak)
+    tracemalloc.stop()
+
+    results = {}
+    for stage, data in stages.items():
+        # Levels the player never dies on or clears have no reloads
+        times = sorted(data['times']) or [0]
+        results[stage] = {
+            'count': len(data['times']),
+            'mean_ms': sum(times) / len(times) * 1000,
+            'p95_ms': times[int(len(times) * 0.95)] * 1000,
+            'max_ms': times[-1] * 1000,
+            'peak_kb': data['peak'] / 1024
+        }
+    return results
+
+# Print the change of each stage's mean time and peak memory against an earlier result file
+def compare(results, baseline):
+    for size, result in results['sizes'].items():
+        if size not in baseline['sizes']:
+            continue
+        for stage, data in result['stages'].items():
+            # Stages added since the baseline was measured have nothing to compare against
+            if stage not in baseline['sizes'][size]['stages']:
+                continue
+            old = baseline['sizes'][size]['stages'][stage]
+            time_ratio = data['mean_ms'] / old['mean_ms'] if old['mean_ms'] else 0
+            memory_ratio = data['peak_kb'] / old['peak_kb'] if old['peak_kb'] else 0
+            print(size + ' ' + stage + ': time ' + str(round(time_ratio, 2)) + 'x, peak memory ' + str(round(memory_ratio, 2)) + 'x')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure how simulation and rendering scale on generated levels of increasing size')
+    parser.add_argument('--sizes', nargs='+', choices=list(LEVEL_SIZES), default=list(LEVEL_SIZES), help='level sizes to measure')
+    parser.add_argument('--frames', type=int, default=300, help='timed frames per level')
+    parser.add_argument('--memory-frames', type=int, default=60, help='frames traced for peak memory per level')
+    parser.add_argument('--seed', type=int, default=0, help='seed for level generation and player input')
+    parser.add_argument('--out', default='benchmark.json', help='path of the JSON results')
+    parser.add_argument('--compare', help='earlier results to compare against')
+    parser.add_argument('--save-levels', help='also write the generated levels as map files into this directory, e.g. to open them in the editor')
+    args = parser.parse_args()
+
+    assets, sfx = init_headless()
+
+    results = {'commit': git_commit(), 'python': platform.python_version(), 'pygame': pygame.version.ver, 'frames': args.frames, 'memory_frames': args.memory_frames, 'seed': args.seed, 'sizes': {}}
+    for size in args.sizes:
+        level = generate_level(seed=args.seed, **LEVEL_SIZES[size])
+        if args.save_levels:
+            os.makedirs(args.save_levels, exist_ok=True)
+            save_json(os.path.join(args.save_levels, size + '.json'), level)
+        stages = measure(level, args.frames, args.memory_frames, assets, sfx, seed=args.seed)
+        results['sizes'][size] = {'level': dict(LEVEL_SIZES[size], tiles=len(level['tilemap']), offgrid=len(level['offgrid'])), 'stages': stages}
+        print(size + ': ' + ', '.join(stage + ' ' + str(round(data['mean_ms'], 2)) + ' ms / ' + str(round(data['peak_kb'])) + ' KB' for stage, data in stages.items()), file=sys.stderr)
+
+    save_json(args.out, results)
+    print('Wrote ' + args.out, file=sys.stderr)
+    if args.compare:
+        f = open(args.compare, 'r')
+        compare(results, json.load(f))
+        f.close()
@@ -0,0 +1,15 @@
+import os
+import argparse
+from scripts.utils import ASSET_PACK_PATH
+from scripts.assetpack import build_pack, PACK_FILES
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack the images, maps and sounds under data/ into one file for the packaged build')
+    parser.add_argument('--out', default=ASSET_PACK_PATH, help='path of the pack to write')
+    args = parser.parse_args()
+
+    index = build_pack(args.out)
+    for source in PACK_FILES:
+        if source not in index['files']:
+            print('Left out ' + source + ', it does not exist')
+    print('Packed ' + str(len(index['images'])) + ' images, ' + str(len(index['maps'])) + ' maps and ' + str(len(index['files'])) + ' sounds into ' + args.out + ' (' + str(os.path.getsize(args.out)) + ' bytes)')
@@ -1,12 +1,19 @@
 import sys
+import argparse
 import pygame
 from scripts.utils import load_images
-from scripts.tilemap import Tilemap
+from scripts.tilemap import Tilemap, FLOOD_LIMIT
+from scripts.saver import MapSaver, AUTOSAVE_INTERVAL
+from scripts.edit_tools import EditHistory, rect_area, line_path, copy_region
+from scripts.overview import ChunkLODs, Minimap, OVERVIEW_ZOOM, MIN_ZOOM, MAX_ZOOM, ZOOM_STEP
+from scripts.profiler import add_profile_args, setup_headless, profiler_from_args
 
 RENDER_SCALE = 2.0
+# Camera movement keys and their index in Editor.movement: left, right, up, down
+MOVEMENT_KEYS = {pygame.K_a: 0, pygame.K_d: 1, pygame.K_w: 2, pygame.K_s: 3}
 
 class Editor:
-    def __init__(self):
+    def __init__(self, profiler=None, autosave=AUTOSAVE_INTERVAL):
         pygame.init()
         # Change window title
         pygame.display.set_caption('Level Editor')
@@ -16,6 +23,8 @@ class Editor:
         self.display = pygame.Surface((320, 240))
         # Restrict at 60 fps runtime to avoid over-processing
         self.clock = pygame.time.Clock()
+        # Optional cProfile or stack sampling session covering the editor loop
+        self.profiler = profiler
 
         self.assets = {
             'decor': load_images('tiles/decor'),
@@ -33,6 +42,12 @@ class Editor:
         except FileNotFoundError:
             pass
 
+        # Saves and autosaves are written on a background thread. Restore any autosaved chunks left behind by a crash.
+        self.saver = MapSaver(autosave_interval=autosave)
+        recovered = self.saver.recover(self.tilemap, 'map.json')
+        if recovered:
+            print('Recovered ' + str(recovered) + ' autosaved chunks, press O to save them into map.json')
+
         # Camera implementation
         self.scroll = [0, 0]
 
@@ -44,10 +59,95 @@ class Editor:
         self.right_clicking = False
         self.shift = False
         self.ongrid = True
+        # Live AutoTiling of the placed or deleted tile and its neighbors
+        self.autotiling = True
+
+        # Area editing tools: brush, line, rect, fill, copy and paste. Each edit is applied to the tilemap as one batch and recorded for undo/redo.
+        self.tool = 'brush'
+        self.history = EditHistory()
+        # Tile where the current line/rect/copy drag started, and last tile painted by the brush
+        self.drag_start = None
+        self.brush_pos = None
+        # Copied region as {relative grid position: (type, variant)}
+        self.clipboard = {}
+
+        # Tab switches to a zoomed out overview of the level drawn from downscaled chunk images, M toggles the minimap in the bottom right corner.
+        # Clicking either moves the camera there.
+        self.lods = ChunkLODs(self.tilemap, self.assets)
+        self.minimap = Minimap(self.lods, pygame.Rect(self.display.get_width() - 84, self.display.get_height() - 64, 80, 60))
+        self.show_minimap = True
+        self.overview = False
+        self.zoom = OVERVIEW_ZOOM
+
+    def current_tile(self):
+        return (self.tile_list[self.tile_group], self.tile_variant)
+
+    # Apply a batch of tile changes and record the delta for undo
+    def edit(self, changes):
+        self.history.record(self.tilemap.apply(changes, autotile=self.autotiling))
+
+    def set_tool(self, tool):
+        # Abandon any drag in progress when switching tools
+        self.drag_start = None
+        self.brush_pos = None
+        self.history.end()
+        self.tool = tool
+
+    # Mouse down on the grid. Fill and paste act immediately, other tools wait for the mouse to be released.
+    def start_tool(self, tile_pos, erase):
+        self.history.begin()
+        if self.tool == 'fill':
+            state = None if erase else self.current_tile()
+            region = self.tilemap.flood_region(tile_pos)
+            if region is None:
+                print('Fill region is larger than ' + str(FLOOD_LIMIT) + ' tiles, nothing was filled')
+                region = []
+            self.edit({region_pos: state for region_pos in region})
+        elif self.tool == 'paste':
+            if not erase:
+                self.edit({(tile_pos[0] + shift[0], tile_pos[1] + shift[1]): state for shift, state in self.clipboard.items()})
+        else:
+            self.drag_start = tile_pos
+
+    # Mouse up. Line, rect and copy apply to the area dragged over. Closes the undo step for the whole stroke.
+    def finish_tool(self, tile_pos, erase):
+        if self.drag_start is not None:
+            state = None if erase else self.current_tile()
+            if self.tool == 'line':
+                self.edit({line_pos: state for line_pos in line_path(self.drag_start, tile_pos)})
+            if self.tool == 'rect':
+                self.edit({rect_pos: state for rect_pos in rect_area(self.drag_start, tile_pos)})
+            if self.tool == 'copy':
+                self.clipboard = copy_region(self.tilemap, self.drag_start, tile_pos)
+                if self.clipboard:
+                    self.tool = 'paste'
+        self.drag_start = None
+        self.brush_pos = None
+        self.history.end()
+
+    # Move the camera so a world pixel position is in the middle of the view
+    def center_on(self, pos):
+        self.scroll = [pos[0] - self.display.get_width() / 2, pos[1] - self.display.get_height() / 2]
+
+    def set_overview(self, overview):
+        # Drop any stroke in progress, the mouse buttons are used for navigation in the overview
+        self.clicking = False
+        self.right_clicking = False
+        self.set_tool(self.tool)
+        self.overview = overview
 
     def run(self):
+        if self.profiler:
+            self.profiler.start()
+
         # Create the game loop for each frame iteration
         while True:
+            self.lods.begin_frame()
+            if self.overview:
+                self.overview_frame()
+                self.present()
+                continue
+
             # Clear screen between each frame with a screen color of RGB values
             self.display.fill((0, 0, 0))
 
@@ -78,41 +178,64 @@ class Editor:
             else:
                 self.display.blit(current_tile_img, mpos)
 
-            # Placing tiles on cursor mouse up
-            if self.clicking and self.ongrid:
-                # Convert index selection into string name for the group
-                self.tilemap.tilemap[str(tile_pos[0]) + ';' + str(tile_pos[1])] = {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': tile_pos}
-            # Deleting tiles on right mouse down
-            if self.right_clicking:
-                tile_loc = str(tile_pos[0]) + ';' + str(tile_pos[1])
-                # Delete if hovered tile exists in tilemap ongrid or if exists in offgrid
-                if tile_loc in self.tilemap.tilemap:
-                    del self.tilemap.tilemap[tile_loc]
+            # Brush tool places tiles on left mouse down and deletes on right mouse down. Paints a line from last frame's tile so fast strokes leave no gaps.
+            if self.tool == 'brush' and ((self.clicking and self.ongrid) or self.right_clicking):
+                state = self.current_tile() if self.clicking else None
+                self.edit({line_pos: state for line_pos in line_path(self.brush_pos or tile_pos, tile_pos)})
+                self.brush_pos = tile_pos
+            # Deleting offgrid tiles on right mouse down
+            if self.right_clicking and self.tool == 'brush':
                 for tile in self.tilemap.offgrid_tiles.copy():
                     tile_img = self.assets[tile['type']][tile['variant']]
                     tile_r = pygame.Rect(tile['pos'][0] - self.scroll[0], tile['pos'][1] - self.scroll[1], tile_img.get_width(), tile_img.get_height())
                     if tile_r.collidepoint(mpos):
-                        self.tilemap.offgrid_tiles.remove(tile)
+                        self.tilemap.remove_offgrid(tile)
+
+            # Preview the area covered by the line, rect or copy drag in progress, and the region about to be pasted
+            if self.drag_start is not None:
+                if self.tool == 'line':
+                    for line_pos in line_path(self.drag_start, tile_pos):
+                        self.display.blit(current_tile_img, (line_pos[0] * self.tilemap.tile_size - self.scroll[0], line_pos[1] * self.tilemap.tile_size - self.scroll[1]))
+                if self.tool in {'rect', 'copy'}:
+                    area_r = pygame.Rect(min(self.drag_start[0], tile_pos[0]) * self.tilemap.tile_size - self.scroll[0], min(self.drag_start[1], tile_pos[1]) * self.tilemap.tile_size - self.scroll[1], (abs(self.drag_start[0] - tile_pos[0]) + 1) * self.tilemap.tile_size, (abs(self.drag_start[1] - tile_pos[1]) + 1) * self.tilemap.tile_size)
+                    pygame.draw.rect(self.display, (255, 255, 255) if self.tool == 'rect' else (0, 160, 255), area_r, 1)
+            if self.tool == 'paste':
+                for shift, state in self.clipboard.items():
+                    paste_img = self.assets[state[0]][state[1]].copy()
+                    paste_img.set_alpha(100)
+                    self.display.blit(paste_img, ((tile_pos[0] + shift[0]) * self.tilemap.tile_size - self.scroll[0], (tile_pos[1] + shift[1]) * self.tilemap.tile_size - self.scroll[1]))
 
             self.display.blit(current_tile_img, (5, 5))
 
+            if self.show_minimap:
+                self.minimap.render(self.display, pygame.Rect(self.scroll[0], self.scroll[1], self.display.get_width(), self.display.get_height()))
+
+            # Write chunks edited since the last save every autosave interval
+            self.saver.autosave(self.tilemap, 'map.json')
+
             # Get user input
             for event in pygame.event.get():
                 # Clicking X to close window
                 if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
+                    self.quit()
                 # On Mouseclick event for Editor
                 if event.type == pygame.MOUSEBUTTONDOWN:
+                    # Left click on the minimap moves the camera instead of editing
+                    if event.button == 1 and self.show_minimap and self.minimap.rect.collidepoint(mpos):
+                        self.center_on(self.minimap.world_pos(mpos))
+                        continue
                     # Left Click Down
                     if event.button == 1:
                         self.clicking = True
                         if not self.ongrid:
                             # Add camera coordinates to cursor coordinates for world coordinates, then add to Off Grid tiles.
-                            self.tilemap.offgrid_tiles.append({'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': (mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])})
+                            self.tilemap.add_offgrid({'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': (mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])})
+                        else:
+                            self.start_tool(tile_pos, erase=False)
                     # Right Click Down
                     if event.button == 3:
                         self.right_clicking = True
+                        self.start_tool(tile_pos, erase=True)
                     if self.shift:
                         # Mousewheel Scroll Up
                         if event.button == 4:
@@ -133,50 +256,130 @@ class Editor:
                     # Left Click Up
                     if event.button == 1:
                         self.clicking = False
+                        self.finish_tool(tile_pos, erase=False)
                     # Right Click Up
                     if event.button == 3:
-                        self.right_clicking = False                             
+                        self.right_clicking = False
+                        self.finish_tool(tile_pos, erase=True)                             
                 # On Keypress event
                 if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_a:
-                        self.movement[0] = True
-                    if event.key == pygame.K_d:
-                        self.movement[1] = True
-                    if event.key == pygame.K_w:
-                        self.movement[2] = True
-                    if event.key == pygame.K_s:
-                        self.movement[3] = True
+                    if event.key in MOVEMENT_KEYS:
+                        self.movement[MOVEMENT_KEYS[event.key]] = True
                     # Pressing G will toggle between On Grid or Off Grid tiles in editor
                     if event.key == pygame.K_g:
                         self.ongrid = not self.ongrid
-                    # Pressing T will do AutoTiling to match appropriate tile variants to their neighbor tiles, this changes all blocks of ground tiles to follow tiling rules
+                    # Pressing T will do AutoTiling to match appropriate tile variants to their neighbor tiles, this changes all blocks of ground tiles to follow tiling rules.
+                    # The pass is one undo step.
                     if event.key == pygame.K_t:
-                        self.tilemap.autotile()
-                    # Pressing O will output save the map to a Json file in editor
+                        self.history.record(self.tilemap.autotile())
+                    # Pressing Y will toggle live AutoTiling of tiles as they are placed or deleted
+                    if event.key == pygame.K_y and not event.mod & pygame.KMOD_CTRL:
+                        self.autotiling = not self.autotiling
+                    # Ctrl+Z undoes the last edit, Ctrl+Y or Ctrl+Shift+Z redoes it
+                    if event.key == pygame.K_z and event.mod & pygame.KMOD_CTRL:
+                        if event.mod & pygame.KMOD_SHIFT:
+                            self.history.redo(self.tilemap)
+                        else:
+                            self.history.undo(self.tilemap)
+                    if event.key == pygame.K_y and event.mod & pygame.KMOD_CTRL:
+                        self.history.redo(self.tilemap)
+                    # Tool selection: B brush, L line, R rectangle, F flood fill, C copy a region, V paste the copied region
+                    if event.key == pygame.K_b:
+                        self.set_tool('brush')
+                    if event.key == pygame.K_l:
+                        self.set_tool('line')
+                    if event.key == pygame.K_r:
+                        self.set_tool('rect')
+                    if event.key == pygame.K_f:
+                        self.set_tool('fill')
+                    if event.key == pygame.K_c:
+                        self.set_tool('copy')
+                    if event.key == pygame.K_v and self.clipboard:
+                        self.set_tool('paste')
+                    # Pressing O will output save the map to a Json file in editor. The file is written in the background without stalling the editor.
                     if event.key == pygame.K_o:
-                        self.tilemap.save('map.json')
+                        self.saver.save(self.tilemap, 'map.json')
                     # Holding Shift will scroll variant tile list in editor
                     if event.key == pygame.K_LSHIFT:
                         self.shift = True
+                    if event.key == pygame.K_TAB:
+                        self.set_overview(True)
+                    if event.key == pygame.K_m:
+                        self.show_minimap = not self.show_minimap
                 # On Keypress release event
                 if event.type == pygame.KEYUP:
-                    if event.key == pygame.K_a:
-                        self.movement[0] = False
-                    if event.key == pygame.K_d:
-                        self.movement[1] = False
-                    if event.key == pygame.K_w:
-                        self.movement[2] = False
-                    if event.key == pygame.K_s:
-                        self.movement[3] = False
+                    if event.key in MOVEMENT_KEYS:
+                        self.movement[MOVEMENT_KEYS[event.key]] = False
                     if event.key == pygame.K_LSHIFT:
                         self.shift = False
-            
-            # Render the display onto the window
-            self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), (0, 0))
-            # Update the display
-            pygame.display.update()
-            # Force at 60 fps
-            self.clock.tick(60)
-
-Editor().run()
+
+            self.present()
+
+    # One frame of the overview. The mouse wheel zooms, left click returns to editing centered on the clicked spot, Tab returns where the camera is.
+    def overview_frame(self):
+        self.display.fill((0, 0, 0))
+        # Pan at the same speed on screen at any zoom
+        self.scroll[0] += (self.movement[1] - self.movement[0]) * 2 / self.zoom
+        self.scroll[1] += (self.movement[3] - self.movement[2]) * 2 / self.zoom
+        center = (self.scroll[0] + self.display.get_width() / 2, self.scroll[1] + self.display.get_height() / 2)
+        self.lods.render(self.display, center, self.zoom)
+
+        mpos = pygame.mouse.get_pos()
+        mpos = (mpos[0] / RENDER_SCALE, mpos[1] / RENDER_SCALE)
+        # Outline of the area the editor will show after clicking
+        view_r = pygame.Rect(0, 0, self.display.get_width() * self.zoom, self.display.get_height() * self.zoom)
+        view_r.center = mpos
+        pygame.draw.rect(self.display, (255, 255, 255), view_r, 1)
+
+        self.saver.autosave(self.tilemap, 'map.json')
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.quit()
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1:
+                    self.center_on((center[0] + (mpos[0] - self.display.get_width() / 2) / self.zoom, center[1] + (mpos[1] - self.display.get_height() / 2) / self.zoom))
+                    self.set_overview(False)
+                # Mousewheel Scroll Up zooms in, Scroll Down zooms out
+                if event.button == 4:
+                    self.zoom = min(MAX_ZOOM, self.zoom * ZOOM_STEP)
+                if event.button == 5:
+                    self.zoom = max(MIN_ZOOM, self.zoom / ZOOM_STEP)
+            if event.type == pygame.KEYDOWN:
+                if event.key in MOVEMENT_KEYS:
+                    self.movement[MOVEMENT_KEYS[event.key]] = True
+                if event.key == pygame.K_TAB:
+                    self.set_overview(False)
+            if event.type == pygame.KEYUP:
+                if event.key in MOVEMENT_KEYS:
+                    self.movement[MOVEMENT_KEYS[event.key]] = False
+
+    def present(self):
+        # Render the display onto the window
+        self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), (0, 0))
+        # Update the display
+        pygame.display.update()
+        # Force at 60 fps
+        self.clock.tick(60)
+
+        # Stop profiling and quit once the profiled frame budget is used up
+        if self.profiler and self.profiler.frame():
+            self.quit()
+
+    def quit(self):
+        # Write out profiling results before the window closes
+        if self.profiler:
+            self.profiler.stop()
+        # Finish any save still being written
+        self.saver.close()
+        pygame.quit()
+        sys.exit()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    add_profile_args(parser)
+    parser.add_argument('--autosave', type=float, default=AUTOSAVE_INTERVAL, help='seconds between autosaves of edited chunks, 0 to disable')
+    args = parser.parse_args()
+    setup_headless(args)
+    Editor(profiler=profiler_from_args(args), autosave=args.autosave).run()
 
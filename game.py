@@ -1,28 +1,92 @@
 import os
 import sys
+import argparse
 import math
 import random
+import threading
+from queue import Queue, Empty
 import pygame
-from scripts.utils import load_image, load_images, Animation
+from scripts.utils import load_image, load_images, load_maps, Animation, BASE_MAP_PATH
 from scripts.entities import PhysicsEntity, Player, Enemy
 from scripts.tilemap import Tilemap
+from scripts.navigation import build_navigation, load_navigation
 from scripts.clouds import Clouds
 from scripts.particle import Particle
 from scripts.spark import Spark
+from scripts.emitter import Emitter, EmitterSystem
+from scripts.renderer import RenderQueue, LAYER_CLOUDS, LAYER_TILES, LAYER_ENTITIES, LAYER_PROJECTILES, LAYER_PARTICLES
+from scripts.pipeline import SnapshotBuffer
+from scripts.audio import AudioManager
+from scripts.profiler import add_profile_args, setup_headless, profiler_from_args
+from scripts.memory import add_memory_args, monitor_from_args
+
+# Graphical Images
+def load_assets():
+    return {
+        'decor': load_images('tiles/decor'),
+        'grass': load_images('tiles/grass'),
+        'large_decor': load_images('tiles/large_decor'),
+        'stone': load_images('tiles/stone'),
+        'player': load_image('entities/player.png'),
+        'background': load_image('background.png'),
+        'clouds': load_images('clouds'),
+        'enemy/idle': Animation(load_images('entities/enemy/idle'), img_dur=6),
+        'enemy/run': Animation(load_images('entities/enemy/run'), img_dur=4),
+        'player/idle': Animation(load_images('entities/player/idle'), img_dur=6),
+        'player/run': Animation(load_images('entities/player/run'), img_dur=4),
+        'player/jump': Animation(load_images('entities/player/jump')),
+        'player/slide': Animation(load_images('entities/player/slide')),
+        'player/wall_slide': Animation(load_images('entities/player/wall_slide')),
+        'particle/leaf': Animation(load_images('particles/leaf'), img_dur=20, loop=False),
+        'particle/particle': Animation(load_images('particles/particle'), img_dur=6, loop=False),
+        'gun': load_image('gun.png'),
+        'projectile': load_image('projectile.png')
+    }
+
+# Sound Effects. Ambience and music are streamed when the game starts running.
+def load_sfx():
+    sfx = AudioManager()
+    # Hits cut off anything else if all channels are busy, enemy shots never cut off the player's own sounds
+    sfx.load('jump', 'data/sfx/jump.wav', volume=0.2, priority=1)
+    sfx.load('dash', 'data/sfx/dash.wav', volume=0.2, priority=1)
+    sfx.load('hit', 'data/sfx/hit.wav', volume=0.2, priority=2)
+    sfx.load('shoot', 'data/sfx/shoot.wav', volume=0.2, priority=0)
+    return sfx
+
+# Start pygame without a window or sound device and load the assets and sounds, for tools that run Game instances headless and share them between instances
+def init_headless():
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    pygame.init()
+    # Images are converted to the display format, so a (dummy) display must exist before loading
+    pygame.display.set_mode((640, 480))
+    return load_assets(), load_sfx()
 
 class Game:
-    def __init__(self):
+    def __init__(self, profiler=None, assets=None, sfx=None, maps=None, pipelined=False, memory=None):
         pygame.init()
         # Change window title
         pygame.display.set_caption('Ninja Game')
-        # Create a window
-        self.screen = pygame.display.set_mode((640, 480))
+        # Create a window, or reuse the one already open when several Game instances run in one process
+        self.screen = pygame.display.get_surface() or pygame.display.set_mode((640, 480))
         # Create the display within the window. For outline shadows on foreground render onto first display, for backgrounds render onto second display.
         self.display = pygame.Surface((320, 240), pygame.SRCALPHA)
         self.display_2 = pygame.Surface((320, 240))
+        # Sprites are queued per display during render and submitted in batches, culled to the display
+        self.display_queue = RenderQueue(self.display)
+        self.display_2_queue = RenderQueue(self.display_2)
+        # Queued, culled and submitted blit counts of the last rendered frame
+        self.render_stats = {'commands': 0, 'culled': 0, 'draw_calls': 0}
 
         # Restrict at 60 fps runtime to avoid over-processing
         self.clock = pygame.time.Clock()
+        # Optional cProfile or stack sampling session covering the game loop
+        self.profiler = profiler
+        # Optional periodic memory accounting for long sessions
+        self.memory = memory
+        # Run the simulation on its own thread, one tick ahead of rendering
+        self.pipelined = pipelined
+        self.sim_thread = None
 
         # # Load images into memory
         # self.img = pygame.image.load('data/images/clouds/cloud_1.png')
@@ -31,40 +95,15 @@ class Game:
         # self.img_pos = [160, 260]
 
         self.movement = [False, False]
-        # Graphical Images
-        self.assets = {
-            'decor': load_images('tiles/decor'),
-            'grass': load_images('tiles/grass'),
-            'large_decor': load_images('tiles/large_decor'),
-            'stone': load_images('tiles/stone'),
-            'player': load_image('entities/player.png'),
-            'background': load_image('background.png'),
-            'clouds': load_images('clouds'),
-            'enemy/idle': Animation(load_images('entities/enemy/idle'), img_dur=6),
-            'enemy/run': Animation(load_images('entities/enemy/run'), img_dur=4),
-            'player/idle': Animation(load_images('entities/player/idle'), img_dur=6),
-            'player/run': Animation(load_images('entities/player/run'), img_dur=4),
-            'player/jump': Animation(load_images('entities/player/jump')),
-            'player/slide': Animation(load_images('entities/player/slide')),
-            'player/wall_slide': Animation(load_images('entities/player/wall_slide')),
-            'particle/leaf': Animation(load_images('particles/leaf'), img_dur=20, loop=False),
-            'particle/particle': Animation(load_images('particles/particle'), img_dur=6, loop=False),
-            'gun': load_image('gun.png'),
-            'projectile': load_image('projectile.png')
-        }
-        # Sound Effects and Music
-        self.sfx = {
-            'jump': pygame.mixer.Sound('data/sfx/jump.wav'),
-            'dash': pygame.mixer.Sound('data/sfx/dash.wav'),
-            'hit': pygame.mixer.Sound('data/sfx/hit.wav'),
-            'shoot': pygame.mixer.Sound('data/sfx/shoot.wav'),
-            'ambience': pygame.mixer.Sound('data/sfx/ambience.wav')
-        }
-        self.sfx['jump'].set_volume(0.2)
-        self.sfx['dash'].set_volume(0.2)
-        self.sfx['hit'].set_volume(0.2)
-        self.sfx['shoot'].set_volume(0.2)
-        self.sfx['ambience'].set_volume(0.1)
+        # Graphical Images and Sound Effects. Can be passed in to share them between several Game instances in one process.
+        self.assets = assets or load_assets()
+        self.sfx = sfx or load_sfx()
+        # Parsed map files, loaded once instead of reading and parsing a file on every level (re)start
+        self.maps = maps or load_maps()
+        # Maps passed in may not come from data/maps, e.g. generated levels, so their analysis cannot be cached next to the map files
+        self.map_files = not maps
+        # Navigation analysis of each map, computed once and reused when a level restarts
+        self.navs = {}
 
         #print(self.assets)
         # self.collision_area = pygame.Rect(50, 50, 300, 50)       
@@ -80,19 +119,30 @@ class Game:
         self.screenshake = 0   
 
     def load_map(self, map_id=0):
-        self.tilemap.load('data/maps/' + str(map_id) + '.json')
+        self.tilemap.load_data(self.maps[map_id])
+        # Static level analysis for enemy patrols and sightlines. Cached next to the map file so it only runs when the map changes.
+        if map_id not in self.navs:
+            if self.map_files:
+                self.navs[map_id] = load_navigation(BASE_MAP_PATH + str(map_id) + '.json', self.tilemap, self.maps[map_id])
+            else:
+                self.navs[map_id] = build_navigation(self.tilemap)
+        self.tilemap.nav = self.navs[map_id]
 
         # Spawn leaf particles falling from Trees
-        self.leaf_spawners = []
+        leaf_emitters = []
         for tree in self.tilemap.extract([('large_decor', 2)], keep=True):
             # Append an offsetted hitbox based on illustrated area of the Tree tile
-            self.leaf_spawners.append(pygame.Rect(4 + tree['pos'][0], 4 + tree['pos'][1], 23, 13))
+            rect = pygame.Rect(4 + tree['pos'][0], 4 + tree['pos'][1], 23, 13)
+            # Divisor controls how seldom Leaves should spawn. Spawns more Leaves proportional to size of Tree image.
+            leaf_emitters.append(Emitter(rect, rate=rect.width * rect.height / 49999))
+        self.leaf_spawners = EmitterSystem(self, leaf_emitters, self.spawn_leaf)
 
         # Get spawn locations for Enemies
         self.enemies = []
         for spawner in self.tilemap.extract([('spawners', 0), ('spawners', 1)]):
             if spawner['variant'] == 0:
-                self.player.pos = spawner['pos']
+                # Copy the position so player movement does not write into the shared map data
+                self.player.pos = list(spawner['pos'])
                 self.player.air_time = 0
             else:
                 self.enemies.append(Enemy(self, spawner['pos'], (8, 15)))
@@ -110,180 +160,343 @@ class Game:
 
     def run(self):
         # Play game music and ambience sfx on infinite loop
-        pygame.mixer.music.load('data/music.wav')
-        pygame.mixer.music.set_volume(0.2)
-        pygame.mixer.music.play(-1)
-        self.sfx['ambience'].play(-1)
+        self.sfx.play_music('data/music.wav', volume=0.2)
+        self.sfx.play_stream('data/sfx/ambience.wav', volume=0.1)
+
+        if self.profiler:
+            self.profiler.start()
+        if self.memory:
+            self.memory.start(self)
+
+        if self.pipelined:
+            self.run_pipelined()
 
         # Create the game loop for each frame iteration
         while True:
-            # Clear screen between each frame with a screen color of RGB values. Make a transparent foreground display.
-            self.display.fill((0, 0, 0, 0))
-            self.display_2.blit(self.assets['background'], (0, 0))
-            #self.display.fill((14, 219, 248))
-
-            self.screenshake = max(0, self.screenshake - 1)
-
-            # Transition to next map if all enemies are killed
-            if not len(self.enemies):
-                self.transition += 1
-                if self.transition > 30:
-                    self.map = min(self.map + 1, len(os.listdir('data/maps')) - 1)
-                    self.load_map(self.map)
-            # When transition counter is 0, screen is shown
-            if self.transition < 0:
-                self.transition += 1
-
-            # After Player Death delay timer
-            if self.dead:
-                self.dead += 1
-                # Transition screen effect when dead
-                if self.dead >= 10:
-                    self.transition = min(30, self.transition + 1)
-                # Restart map after some time when dead
-                if self.dead > 40:
-                    self.load_map(self.map)
-            else:
-                # If player falls off map edge, set player death and restart map
-                if abs(self.player.rect().centery) >= self.display.get_height() * 2.5:
-                    self.dead += 1
+            self.update()
+            self.render()
+            self.handle_events()
+            # Update the display
+            pygame.display.update()
+            # Force at 60 fps
+            self.clock.tick(60)
 
-            # Center camera onto player entity
-            self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 30
-            self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.scroll[1]) / 30
-            # Smooth the scrolling without subpixel render jitters by converting scroll values from player position from float to int
-            render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
-
-            # Look for Leaf particle spawners
-            for rect in self.leaf_spawners:
-                # Multiplier controls how seldom Leaves should spawn. Spawns more Leaves proportional to size of Tree image.
-                if random.random() * 49999 < rect.width * rect.height:
-                    # Find some random xy position within the size bounds of the Rect hitbox
-                    pos = (rect.x + random.random() * rect.width, rect.y + random.random() * rect.height)
-                    # Spawn a leaf particle at the given position at a constant velocity (slowly moving left and down). Start from random frame between 0-20 incl for diversity effect
-                    self.particles.append(Particle(self, 'leaf', pos, velocity=[-0.1, 0.3], frame=random.randint(0, 20)))
-
-            self.clouds.update()
-            self.clouds.render(self.display_2, offset=render_scroll)
-
-            self.tilemap.render(self.display, offset=render_scroll)
-               
-            # # Collision handling
-            # img_r = pygame.Rect(self.img_pos[0], self.img_pos[1], self.img.get_width(), self.img.get_height())
-            # if img_r.colliderect(self.collision_area):
-            #     pygame.draw.rect(self.screen, (0, 100, 255), self.collision_area)
-            # else:
-            #     pygame.draw.rect(self.screen, (0, 50, 155), self.collision_area)
-            # # Move image based on keypress
-            # self.img_pos[1] += (self.movement[1] - self.movement[0]) * 5
-            # # Put images on screen at coordinate x, y starting from topleft
-            # self.screen.blit(self.img, self.img_pos)
-
-            # Render Enemies
-            for enemy in self.enemies.copy():
-                kill = enemy.update(self.tilemap, (0, 0))
-                enemy.render(self.display, offset=render_scroll)
-                if kill:
-                    self.enemies.remove(enemy)
-
-            # Render Player
-            if not self.dead:
-                self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0))
-                self.player.render(self.display, offset=render_scroll)
-
-            # Render Projectiles. Projectile list = [[x, y], direction, timer]
-            for projectile in self.projectiles.copy():
-                projectile[0][0] += projectile[1]
-                projectile[2] += 1
-                img = self.assets['projectile']
-                self.display.blit(img, (projectile[0][0] - img.get_width() / 2 - render_scroll[0], projectile[0][1] - img.get_height() / 2 - render_scroll[1]))
-                # Remove projectile if it hits a physics tile
-                if self.tilemap.solid_check(projectile[0]):
-                    self.projectiles.remove(projectile)
-                    for i in range(4):
-                        # Bounce sparks to the left only if projectile is going right and hits a wall
-                        self.sparks.append(Spark(projectile[0], random.random() - 0.5 + (math.pi if projectile[1] > 0 else 0), 2 + random.random()))
-                elif projectile[2] > 360:
-                    self.projectiles.remove(projectile)
-                elif abs(self.player.dashing) < 50:
-                    # Player death if player is not dashing and player hitbox collides with gun projectile
-                    if self.player.rect().collidepoint(projectile[0]):
-                        self.projectiles.remove(projectile)
-                        self.dead += 1
-                        self.sfx['hit'].play()
-                        self.screenshake = max(16, self.screenshake)
-                        # White Sparks and Black particles explode outward when hit player
-                        for i in range(30):
-                            angle = random.random() * math.pi * 2
-                            speed = random.random() * 5
-                            self.sparks.append(Spark(self.player.rect().center, angle, 2 + random.random()))
-                            self.particles.append(Particle(self, 'particle', self.player.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7)))
-
-            # Spark effects
-            for spark in self.sparks.copy():
-                kill = spark.update()
-                spark.render(self.display_2, offset=render_scroll)
-                if kill:
-                    self.sparks.remove(spark)
-
-            # Shadow silhouette outlines using mask from the display
-            display_mask = pygame.mask.from_surface(self.display)
-            display_silhouette = display_mask.to_surface(setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0))
-            # Shadow positional transformation enlarge one pixel in each of four directions
-            for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                self.display_2.blit(display_silhouette, offset)
-
-            # Check if need to remove particle after animation finishes
-            for particle in self.particles.copy():
-                kill = particle.update()
-                particle.render(self.display, offset=render_scroll)
-                if particle.type == 'leaf':
-                    # Sine function to smooth values limited between -1 and 1. Makes particle move wavelike naturally (e.g. sway left/right as leaf falls), slowed by a multiplier.
-                    particle.pos[0] += math.sin(particle.animation.frame * 0.035) * 0.3
-                if kill:
-                    self.particles.remove(particle)
-
-            # Get user input
+            if self.memory:
+                self.memory.frame()
+
+            if self.profiler:
+                self.count_frame()
+                # Stop profiling and quit once the profiled frame budget is used up
+                if self.profiler.frame():
+                    self.quit()
+
+    # Game loop with the simulation on a background thread. The main thread keeps drawing the newest snapshot and forwards input, since SDL events and the window belong to it.
+    # Each tick's physics and AI run while the previous tick is being composited, scaled and shown.
+    def run_pipelined(self):
+        self.snapshots = SnapshotBuffer()
+        self.events = Queue()
+        self.running = True
+        self.sim_clock = pygame.time.Clock()
+        simulate = self.profiler.wrap(self.simulate) if self.profiler else self.simulate
+        self.sim_thread = threading.Thread(target=simulate, name='simulation', daemon=True)
+        self.sim_thread.start()
+
+        tick = 0
+        while True:
+            # Wait for the next tick, but not so long that the window stops responding if the simulation falls behind
+            tick, snapshot = self.snapshots.latest(tick, timeout=0.1)
+            if snapshot:
+                self.draw_frame(snapshot)
             for event in pygame.event.get():
-                # Clicking X to close window
                 if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                # On Keypress event
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_LEFT or event.key == pygame.K_a:
-                        self.movement[0] = True
-                    if event.key == pygame.K_RIGHT or event.key == pygame.K_d:
-                        self.movement[1] = True
-                    if event.key == pygame.K_UP or event.key == pygame.K_w or event.key == pygame.K_SPACE:
-                        if self.player.jump():
-                            self.sfx['jump'].play()
-                    if event.key == pygame.K_e:
-                        self.player.dash()
-                # On Keypress release event
-                if event.type == pygame.KEYUP:
-                    if event.key == pygame.K_LEFT or event.key == pygame.K_a:
-                        self.movement[0] = False
-                    if event.key == pygame.K_RIGHT or event.key == pygame.K_d:
-                        self.movement[1] = False
-            
-            if self.transition:
-                transition_surf = pygame.Surface(self.display.get_size())
-                # Draw a zooming in and out circle mask around screen during map level transitions
-                pygame.draw.circle(transition_surf, (255, 255, 255), (self.display.get_width() // 2, self.display.get_height() // 2), (30 - abs(self.transition)) * 8)
-                # Ignore the white color and make it transparent
-                transition_surf.set_colorkey((255, 255, 255))
-                self.display.blit(transition_surf, (0, 0))
-
-            self.display_2.blit(self.display, (0, 0))
-
-            screenshake_offset = (random.random() * self.screenshake - self.screenshake / 2, random.random() * self.screenshake - self.screenshake / 2)
-            # Render the display onto the window
-            self.screen.blit(pygame.transform.scale(self.display_2, self.screen.get_size()), screenshake_offset)
-            # Update the display
+                    self.quit()
+                self.events.put(event)
             pygame.display.update()
-            # Force at 60 fps
             self.clock.tick(60)
 
-Game().run()
+            if self.memory:
+                self.memory.frame()
+            if self.profiler:
+                self.count_frame()
+                if self.profiler.frame():
+                    self.quit()
+
+    # Report this frame's render and audio numbers to the profiler
+    def count_frame(self):
+        for name, value in self.render_stats.items():
+            self.profiler.count(name, value)
+        audio = self.sfx.stats()
+        self.profiler.count('active_voices', audio['active_voices'])
+        self.profiler.gauge('decoded_audio_bytes', audio['decoded_bytes'])
+
+    # Simulation thread of the pipelined game loop. Applies forwarded input, advances one tick and publishes what to draw for it, at the same 60 ticks per second.
+    def simulate(self):
+        try:
+            while self.running:
+                while True:
+                    try:
+                        self.handle_event(self.events.get_nowait())
+                    except Empty:
+                        break
+                self.update()
+                self.snapshots.publish(self.record_frame())
+                self.sim_clock.tick(60)
+        except Exception as error:
+            self.snapshots.fail(error)
+
+    # Advance the simulation by one frame. Does not draw anything, so it can also run headless.
+    def update(self):
+        self.sfx.update()
+        self.screenshake = max(0, self.screenshake - 1)
+
+        # Transition to next map if all enemies are killed
+        if not len(self.enemies):
+            self.transition += 1
+            if self.transition > 30:
+                self.map = min(self.map + 1, len(self.maps) - 1)
+                self.load_map(self.map)
+        # When transition counter is 0, screen is shown
+        if self.transition < 0:
+            self.transition += 1
+
+        # After Player Death delay timer
+        if self.dead:
+            self.dead += 1
+            # Transition screen effect when dead
+            if self.dead >= 10:
+                self.transition = min(30, self.transition + 1)
+            # Restart map after some time when dead
+            if self.dead > 40:
+                self.load_map(self.map)
+        else:
+            # If player falls off map edge, set player death and restart map
+            if abs(self.player.rect().centery) >= self.display.get_height() * 2.5:
+                self.dead += 1
+
+        # Center camera onto player entity
+        self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 30
+        self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.scroll[1]) / 30
+
+        # Spawn Leaves only from Trees near the camera
+        self.leaf_spawners.update(pygame.Rect(self.scroll[0], self.scroll[1], self.display.get_width(), self.display.get_height()))
+
+        self.clouds.update()
+
+        # Update Enemies
+        for enemy in self.enemies.copy():
+            kill = enemy.update(self.tilemap, (0, 0))
+            if kill:
+                self.enemies.remove(enemy)
+
+        # Update Player
+        if not self.dead:
+            self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0))
+
+        # Update Projectiles. Projectile list = [[x, y], direction, timer]
+        for projectile in self.projectiles.copy():
+            projectile[0][0] += projectile[1]
+            projectile[2] += 1
+            # Remove projectile if it hits a physics tile
+            if self.tilemap.solid_check(projectile[0]):
+                self.projectiles.remove(projectile)
+                for i in range(4):
+                    # Bounce sparks to the left only if projectile is going right and hits a wall
+                    self.sparks.append(Spark(projectile[0], random.random() - 0.5 + (math.pi if projectile[1] > 0 else 0), 2 + random.random()))
+            elif projectile[2] > 360:
+                self.projectiles.remove(projectile)
+            elif abs(self.player.dashing) < 50:
+                # Player death if player is not dashing and player hitbox collides with gun projectile
+                if self.player.rect().collidepoint(projectile[0]):
+                    self.projectiles.remove(projectile)
+                    self.dead += 1
+                    self.sfx.play('hit')
+                    self.screenshake = max(16, self.screenshake)
+                    # White Sparks and Black particles explode outward when hit player
+                    for i in range(30):
+                        angle = random.random() * math.pi * 2
+                        speed = random.random() * 5
+                        self.sparks.append(Spark(self.player.rect().center, angle, 2 + random.random()))
+                        self.particles.append(Particle(self, 'particle', self.player.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7)))
+
+        # Spark effects
+        for spark in self.sparks.copy():
+            kill = spark.update()
+            if kill:
+                self.sparks.remove(spark)
+
+        # Check if need to remove particle after animation finishes
+        for particle in self.particles.copy():
+            kill = particle.update()
+            if particle.type == 'leaf':
+                # Sine function to smooth values limited between -1 and 1. Makes particle move wavelike naturally (e.g. sway left/right as leaf falls), slowed by a multiplier.
+                particle.pos[0] += math.sin(particle.animation.frame * 0.035) * 0.3
+            if kill:
+                self.leaf_spawners.release(particle)
+                self.particles.remove(particle)
+
+    def spawn_leaf(self, emitter):
+        rect = emitter.rect
+        # Find some random xy position within the size bounds of the Rect hitbox
+        pos = (rect.x + random.random() * rect.width, rect.y + random.random() * rect.height)
+        # Spawn a leaf particle at the given position at a constant velocity (slowly moving left and down). Start from random frame between 0-20 incl for diversity effect
+        return Particle(self, 'leaf', pos, velocity=[-0.1, 0.3], frame=random.randint(0, 20))
+
+    # Draw the current frame onto the window
+    def render(self):
+        self.draw_frame(self.record_frame())
+
+    # Collect what to draw for the current state. The snapshot shares nothing the simulation changes afterwards, so it can be drawn while the next tick runs.
+    def record_frame(self):
+        # Smooth the scrolling without subpixel render jitters by converting scroll values from player position from float to int
+        render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
+
+        queue = self.display_queue
+        queue_2 = self.display_2_queue
+
+        queue_2.layer = LAYER_CLOUDS
+        self.clouds.render(queue_2, offset=render_scroll)
+
+        queue.layer = LAYER_TILES
+        self.tilemap.render(queue, offset=render_scroll)
+
+        # # Collision handling
+        # img_r = pygame.Rect(self.img_pos[0], self.img_pos[1], self.img.get_width(), self.img.get_height())
+        # if img_r.colliderect(self.collision_area):
+        #     pygame.draw.rect(self.screen, (0, 100, 255), self.collision_area)
+        # else:
+        #     pygame.draw.rect(self.screen, (0, 50, 155), self.collision_area)
+        # # Move image based on keypress
+        # self.img_pos[1] += (self.movement[1] - self.movement[0]) * 5
+        # # Put images on screen at coordinate x, y starting from topleft
+        # self.screen.blit(self.img, self.img_pos)
+
+        # Render Enemies
+        queue.layer = LAYER_ENTITIES
+        for enemy in self.enemies:
+            enemy.render(queue, offset=render_scroll)
+
+        # Render Player
+        if not self.dead:
+            self.player.render(queue, offset=render_scroll)
+
+        # Render Projectiles
+        queue.layer = LAYER_PROJECTILES
+        for projectile in self.projectiles:
+            img = self.assets['projectile']
+            queue.blit(img, (projectile[0][0] - img.get_width() / 2 - render_scroll[0], projectile[0][1] - img.get_height() / 2 - render_scroll[1]))
+
+        background = queue_2.take()
+        foreground = queue.take()
+
+        # Particles are drawn after the silhouette, so they cast no shadow
+        queue.layer = LAYER_PARTICLES
+        for particle in self.particles:
+            particle.render(queue, offset=render_scroll)
+
+        return {
+            'scroll': render_scroll,
+            'background': background,
+            'foreground': foreground,
+            'particles': queue.take(),
+            # Copies, since sparks keep moving in the simulation
+            'sparks': [Spark(spark.pos, spark.angle, spark.speed) for spark in self.sparks],
+            'transition': self.transition,
+            'screenshake_offset': (random.random() * self.screenshake - self.screenshake / 2, random.random() * self.screenshake - self.screenshake / 2)
+        }
+
+    # Draw a snapshot from record_frame onto the window
+    def draw_frame(self, snapshot):
+        # Clear screen between each frame with a screen color of RGB values. Make a transparent foreground display.
+        self.display.fill((0, 0, 0, 0))
+        self.display_2.blit(self.assets['background'], (0, 0))
+        #self.display.fill((14, 219, 248))
+
+        queue = self.display_queue
+        queue_2 = self.display_2_queue
+        queue.reset_stats()
+        queue_2.reset_stats()
+
+        # Submit queued sprites. Everything so far must be on the displays before the sparks are drawn and the silhouette is taken.
+        queue_2.flush(snapshot['background'])
+        queue.flush(snapshot['foreground'])
+
+        # Spark effects are polygons, so they are drawn directly
+        for spark in snapshot['sparks']:
+            spark.render(self.display_2, offset=snapshot['scroll'])
+
+        # Shadow silhouette outlines using mask from the display
+        display_mask = pygame.mask.from_surface(self.display)
+        display_silhouette = display_mask.to_surface(setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0))
+        # Shadow positional transformation enlarge one pixel in each of four directions
+        for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            self.display_2.blit(display_silhouette, offset)
+
+        queue.flush(snapshot['particles'])
+
+        for key in self.render_stats:
+            self.render_stats[key] = queue.stats[key] + queue_2.stats[key]
+
+        transition = snapshot['transition']
+        if transition:
+            transition_surf = pygame.Surface(self.display.get_size())
+            # Draw a zooming in and out circle mask around screen during map level transitions
+            pygame.draw.circle(transition_surf, (255, 255, 255), (self.display.get_width() // 2, self.display.get_height() // 2), (30 - abs(transition)) * 8)
+            # Ignore the white color and make it transparent
+            transition_surf.set_colorkey((255, 255, 255))
+            self.display.blit(transition_surf, (0, 0))
+
+        self.display_2.blit(self.display, (0, 0))
+
+        # Render the display onto the window
+        self.screen.blit(pygame.transform.scale(self.display_2, self.screen.get_size()), snapshot['screenshake_offset'])
+
+    # Get user input
+    def handle_events(self):
+        for event in pygame.event.get():
+            self.handle_event(event)
+
+    def handle_event(self, event):
+        # Clicking X to close window
+        if event.type == pygame.QUIT:
+            self.quit()
+        # On Keypress event
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_LEFT or event.key == pygame.K_a:
+                self.movement[0] = True
+            if event.key == pygame.K_RIGHT or event.key == pygame.K_d:
+                self.movement[1] = True
+            if event.key == pygame.K_UP or event.key == pygame.K_w or event.key == pygame.K_SPACE:
+                if self.player.jump():
+                    self.sfx.play('jump')
+            if event.key == pygame.K_e:
+                self.player.dash()
+        # On Keypress release event
+        if event.type == pygame.KEYUP:
+            if event.key == pygame.K_LEFT or event.key == pygame.K_a:
+                self.movement[0] = False
+            if event.key == pygame.K_RIGHT or event.key == pygame.K_d:
+                self.movement[1] = False
+
+    def quit(self):
+        if self.sim_thread:
+            # Let the simulation finish its tick before tearing down pygame underneath it
+            self.running = False
+            self.sim_thread.join()
+            print('Pipelined: ' + str(round(self.clock.get_fps(), 1)) + ' fps rendered, ' + str(round(self.sim_clock.get_fps(), 1)) + ' ticks/sec simulated, ' + str(self.snapshots.dropped) + ' of ' + str(self.snapshots.tick) + ' ticks never drawn', file=sys.stderr)
+        # Write out profiling results before the window closes
+        if self.profiler:
+            self.profiler.stop()
+        if self.memory:
+            self.memory.stop()
+        pygame.quit()
+        sys.exit()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    add_profile_args(parser)
+    add_memory_args(parser)
+    parser.add_argument('--pipelined', action='store_true', help='run the simulation on a separate thread from rendering')
+    args = parser.parse_args()
+    setup_headless(args)
+    Game(profiler=profiler_from_args(args), pipelined=args.pipelined, memory=monitor_from_args(args)).run()
 
@@ -5,7 +5,8 @@ a = Analysis(
     ['game.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    # Every image, map and sound in one file, built with build_assets.py
+    datas=[('data/assets.pak', 'data')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,170 @@
+import os
+import io
+import json
+import mmap
+import struct
+import weakref
+import pygame
+
+# File layout: a header of magic, format version and index length, the JSON index, then the data blobs. Index offsets count from the start of the file.
+PACK_MAGIC = b'NINJAPAK'
+PACK_VERSION = 1
+PACK_HEADER = struct.Struct('<8sII')
+# Blobs start on this alignment so pixel data can be used in place
+BLOB_ALIGN = 16
+# Sound and music files to pack, besides every image and map
+PACK_FILES = ['data/sfx/jump.wav', 'data/sfx/dash.wav', 'data/sfx/hit.wav', 'data/sfx/shoot.wav', 'data/sfx/ambience.wav', 'data/music.wav']
+
+# Modification time and size of a loose file, or None if it does not exist
+def file_stamp(path):
+    try:
+        return [os.path.getmtime(path), os.path.getsize(path)]
+    except OSError:
+        return None
+
+# A built asset pack, memory mapped. Images are stored as BGRA pixels with the black colorkey already turned into transparency, so surfaces are made straight from the mapping.
+# Each entry remembers the loose file it was built from. If that file exists and has changed since, the entry is treated as missing so edits show up without a rebuild.
+class AssetPack:
+    def __init__(self, path):
+        f = open(path, 'rb')
+        # Copy on write, so drawing onto a surface made from the mapping never writes back to the file
+        self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        f.close()
+        magic, version, index_size = PACK_HEADER.unpack_from(self.data, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError(path + ' is not a version ' + str(PACK_VERSION) + ' asset pack')
+        self.index = json.loads(self.data[PACK_HEADER.size:PACK_HEADER.size + index_size])
+        self.view = memoryview(self.data)
+        # Surfaces made by image(). Their pixels live in the mapping, so memory accounting counts them as part of it.
+        self.surfaces = weakref.WeakSet()
+
+    # Index entry of kind 'images' (by path under data/images), 'files' (by path) or 'maps' (by map id), or None if it is not packed or out of date
+    def entry(self, kind, key):
+        entries = self.index[kind]
+        if kind == 'maps':
+            entry = entries[key] if key < len(entries) else None
+        else:
+            entry = entries.get(key)
+        if entry and file_stamp(entry['source']) not in (None, entry['stamp']):
+            return None
+        return entry
+
+    # Bytes of an entry, without copying them out of the mapping
+    def blob(self, entry):
+        return self.view[entry['offset']:entry['offset'] + entry['size']]
+
+    def image(self, entry):
+        img = pygame.image.frombuffer(self.blob(entry), entry['size_px'], 'BGRA')
+        self.surfaces.add(img)
+        return img
+
+    def open(self, entry):
+        return PackFile(self.blob(entry))
+
+# Read-only file object over a blob of the mapping, so packed files are read without copying them out first
+class PackFile(io.RawIOBase):
+    def __init__(self, view):
+        self.view = view
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = max(0, min(len(buffer), len(self.view) - self.pos))
+        buffer[:count] = self.view[self.pos:self.pos + count]
+        self.pos += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+# The pack at path, or None if there is none
+def open_pack(path):
+    if not os.path.exists(path):
+        return None
+    return AssetPack(path)
+
+# Pixels of an image file in the pack's BGRA format. Black becomes transparent like the colorkey load_image sets on loose images.
+def image_pixels(path):
+    img = pygame.image.load(path)
+    rgb = pygame.image.tobytes(img, 'RGB')
+    pixels = bytearray(len(rgb) // 3 * 4)
+    pixels[0::4] = rgb[2::3]
+    pixels[1::4] = rgb[1::3]
+    pixels[2::4] = rgb[0::3]
+    pixels[3::4] = bytes(255 if rgb[i] or rgb[i + 1] or rgb[i + 2] else 0 for i in range(0, len(rgb), 3))
+    return img.get_size(), bytes(pixels)
+
+# Build a pack at out_path from the loose files under data/
+def build_pack(out_path, img_path='data/images/', map_path='data/maps/', files=PACK_FILES):
+    index = {'images': {}, 'dirs': {}, 'maps': [], 'files': {}}
+    blobs = []
+
+    def add(entry, source, data):
+        entry['source'] = source
+        entry['stamp'] = file_stamp(source)
+        entry['size'] = len(data)
+        blobs.append((entry, data))
+        return entry
+
+    for root, dirs, names in sorted(os.walk(img_path)):
+        rel_dir = os.path.relpath(root, img_path).replace(os.sep, '/')
+        pngs = sorted(name for name in names if name.endswith('.png'))
+        if rel_dir != '.':
+            index['dirs'][rel_dir] = pngs
+        for name in pngs:
+            source = os.path.join(root, name).replace(os.sep, '/')
+            size, pixels = image_pixels(source)
+            key = name if rel_dir == '.' else rel_dir + '/' + name
+            index['images'][key] = add({'size_px': size}, source, pixels)
+
+    map_count = len([name for name in os.listdir(map_path) if name.endswith('.json')])
+    for map_id in range(map_count):
+        source = map_path + str(map_id) + '.json'
+        f = open(source, 'rb')
+        index['maps'].append(add({}, source, f.read()))
+        f.close()
+
+    for source in files:
+        # Files missing from this checkout are left out, and the game falls back to the loose file like for anything else not packed
+        if not os.path.exists(source):
+            continue
+        f = open(source, 'rb')
+        index['files'][source] = add({}, source, f.read())
+        f.close()
+
+    # Offsets depend on the index size and the index holds the offsets, so lay out blobs until the index length stops changing
+    index_size = 0
+    while True:
+        offset = PACK_HEADER.size + index_size
+        for entry, data in blobs:
+            offset += -offset % BLOB_ALIGN
+            entry['offset'] = offset
+            offset += len(data)
+        index_data = json.dumps(index).encode('utf-8')
+        if len(index_data) == index_size:
+            break
+        index_size = len(index_data)
+
+    temp_path = out_path + '.tmp'
+    f = open(temp_path, 'wb')
+    f.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, index_size))
+    f.write(index_data)
+    for entry, data in blobs:
+        f.write(b'\0' * (entry['offset'] - f.tell()))
+        f.write(data)
+    f.close()
+    os.replace(temp_path, out_path)
+    return index
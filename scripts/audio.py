@@ -0,0 +1,141 @@
+import io
+import wave
+import pygame
+from scripts.utils import open_asset
+
+# Mixer channels shared by all sound effects. The channel after them is kept for the streamed ambience.
+VOICE_COUNT = 8
+# Frames before the same sound can start again. Also stops several entities from stacking the same sound in one frame.
+DEFAULT_COOLDOWN = 4
+# Seconds of a streamed track decoded at a time. Two chunks are held at once, the playing one and the one queued behind it.
+STREAM_CHUNK_SECONDS = 0.5
+
+# Bytes of mixer memory a decoded sound takes up
+def decoded_size(sound):
+    frequency, size, channels = pygame.mixer.get_init()
+    return int(sound.get_length() * frequency) * abs(size) // 8 * channels
+
+# Plays a long wav file in a loop on one channel, decoding only a short chunk at a time instead of the whole file
+class AudioStream:
+    def __init__(self, path, channel, volume=1.0):
+        self.file = open_asset(path)
+        self.wav = wave.open(self.file, 'rb')
+        self.channel = channel
+        self.volume = volume
+        self.chunk_frames = int(self.wav.getframerate() * STREAM_CHUNK_SECONDS)
+        # Decoded bytes of the chunks currently held
+        self.chunk_bytes = [0, 0]
+        self.channel.play(self.next_chunk())
+        self.channel.queue(self.next_chunk())
+
+    def next_chunk(self):
+        frames = self.wav.readframes(self.chunk_frames)
+        if not frames:
+            # Loop back to the start of the track
+            self.wav.rewind()
+            frames = self.wav.readframes(self.chunk_frames)
+        # Wrap the raw frames in a wav header so the mixer converts them from the file's format to its own
+        buffer = io.BytesIO()
+        chunk = wave.open(buffer, 'wb')
+        chunk.setparams(self.wav.getparams())
+        chunk.writeframes(frames)
+        chunk.close()
+        buffer.seek(0)
+        sound = pygame.mixer.Sound(file=buffer)
+        sound.set_volume(self.volume)
+        self.chunk_bytes = [self.chunk_bytes[1], decoded_size(sound)]
+        return sound
+
+    # Queue the next chunk once the previous queued one has started playing
+    def update(self):
+        if self.channel.get_queue() is None:
+            self.channel.queue(self.next_chunk())
+
+    def stop(self):
+        self.channel.stop()
+        self.wav.close()
+        self.file.close()
+
+# Owns the mixer channels for sound effects. Sounds are played by name, at most once per cooldown, and when every channel is busy a new sound
+# replaces the oldest playing sound of the lowest priority that is not above its own, or is dropped if all playing sounds matter more.
+class AudioManager:
+    def __init__(self, voices=VOICE_COUNT):
+        pygame.mixer.set_num_channels(voices + 1)
+        self.channels = [pygame.mixer.Channel(i) for i in range(voices)]
+        self.stream_channel = pygame.mixer.Channel(voices)
+        # Sound, priority, cooldown and decoded size of each loaded sound
+        self.sounds = {}
+        # Name, priority and start frame of the sound last started on each channel
+        self.voices = [None] * voices
+        # Frame each sound last started on, for the cooldowns
+        self.last_played = {}
+        self.frame = 0
+        self.stream = None
+        self.dropped = 0
+        self.stolen = 0
+
+    def load(self, name, path, volume=1.0, priority=0, cooldown=DEFAULT_COOLDOWN):
+        f = open_asset(path)
+        sound = pygame.mixer.Sound(file=f)
+        f.close()
+        sound.set_volume(volume)
+        self.sounds[name] = {'sound': sound, 'priority': priority, 'cooldown': cooldown, 'bytes': decoded_size(sound)}
+
+    # Start a sound. Returns the channel it plays on, or None if it was skipped.
+    def play(self, name):
+        entry = self.sounds[name]
+        last = self.last_played.get(name)
+        if last is not None and self.frame - last < max(1, entry['cooldown']):
+            return None
+        index = self.free_voice(entry['priority'])
+        if index is None:
+            self.dropped += 1
+            return None
+        self.channels[index].play(entry['sound'])
+        self.voices[index] = (name, entry['priority'], self.frame)
+        self.last_played[name] = self.frame
+        return self.channels[index]
+
+    # Index of an idle channel, or of the channel to steal for a sound of the given priority
+    def free_voice(self, priority):
+        steal = None
+        for i, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return i
+            voice = self.voices[i]
+            if voice and voice[1] <= priority and (steal is None or voice[1:] < self.voices[steal][1:]):
+                steal = i
+        if steal is not None:
+            self.stolen += 1
+        return steal
+
+    # Called once per frame
+    def update(self):
+        self.frame += 1
+        if self.stream:
+            self.stream.update()
+
+    # Loop a long track on the ambience channel, decoded in chunks while it plays
+    def play_stream(self, path, volume=1.0):
+        self.stop_stream()
+        self.stream = AudioStream(path, self.stream_channel, volume)
+
+    def stop_stream(self):
+        if self.stream:
+            self.stream.stop()
+            self.stream = None
+
+    # Music is streamed by pygame itself
+    def play_music(self, path, volume=1.0):
+        pygame.mixer.music.load(open_asset(path))
+        pygame.mixer.music.set_volume(volume)
+        pygame.mixer.music.play(-1)
+
+    def stats(self):
+        return {
+            'active_voices': sum(1 for channel in self.channels if channel.get_busy()),
+            'voices': len(self.channels),
+            'dropped': self.dropped,
+            'stolen': self.stolen,
+            'decoded_bytes': sum(entry['bytes'] for entry in self.sounds.values()) + (sum(self.stream.chunk_bytes) if self.stream else 0)
+        }
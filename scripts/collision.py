@@ -0,0 +1,60 @@
+import pygame
+
+# Collision geometry for the solid tiles of a tilemap. Contiguous solid tiles are merged into as few rectangles as possible, per chunk, so
+# entities test against a handful of large colliders instead of one Rect per tile, and there are no seams between neighboring tiles to snag on.
+# Colliders are plain pixel space Rects, so the same mesh can serve any other query against level geometry, e.g. shadows or raycasts.
+class CollisionMesh:
+    def __init__(self, tile_size, chunk_size):
+        self.tile_size = tile_size
+        self.chunk_size = chunk_size
+        # Merged collider Rects of each chunk that holds solid tiles
+        self.chunks = {}
+
+    # Merge all solid grid positions into colliders
+    def build(self, solid):
+        self.chunks = {}
+        chunk_cells = {}
+        for tile_pos in solid:
+            chunk_cells.setdefault((tile_pos[0] // self.chunk_size, tile_pos[1] // self.chunk_size), set()).add(tile_pos)
+        for chunk, cells in chunk_cells.items():
+            self.chunks[chunk] = self.merge(cells)
+
+    # Rebuild one chunk after its tiles were edited. Only the solid grid positions inside the chunk are needed.
+    def update_chunk(self, chunk, cells):
+        if cells:
+            self.chunks[chunk] = self.merge(cells)
+        elif chunk in self.chunks:
+            del self.chunks[chunk]
+
+    # Greedy meshing: take the top left remaining cell, grow it right as far as possible, then grow the whole row down as far as possible
+    def merge(self, cells):
+        remaining = set(cells)
+        rects = []
+        for (x, y) in sorted(cells, key=lambda tile_pos: (tile_pos[1], tile_pos[0])):
+            if (x, y) not in remaining:
+                continue
+            width = 1
+            while (x + width, y) in remaining:
+                width += 1
+            height = 1
+            while all((x + i, y + height) in remaining for i in range(width)):
+                height += 1
+            for i in range(width):
+                for j in range(height):
+                    remaining.discard((x + i, y + j))
+            rects.append(pygame.Rect(x * self.tile_size, y * self.tile_size, width * self.tile_size, height * self.tile_size))
+        return rects
+
+    # Colliders overlapping a pixel space Rect
+    def rects_in(self, area):
+        chunk_px = self.tile_size * self.chunk_size
+        rects = []
+        for cx in range(area.left // chunk_px, (area.right - 1) // chunk_px + 1):
+            for cy in range(area.top // chunk_px, (area.bottom - 1) // chunk_px + 1):
+                for rect in self.chunks.get((cx, cy), ()):
+                    if rect.colliderect(area):
+                        rects.append(rect)
+        return rects
+
+    def count(self):
+        return sum(len(rects) for rects in self.chunks.values())
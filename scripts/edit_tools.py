@@ -0,0 +1,94 @@
+# Maximum number of undo steps kept by the editor
+MAX_HISTORY = 200
+
+# Grid positions covered by the rectangle between two corner tiles, inclusive
+def rect_area(start, end):
+    positions = []
+    for x in range(min(start[0], end[0]), max(start[0], end[0]) + 1):
+        for y in range(min(start[1], end[1]), max(start[1], end[1]) + 1):
+            positions.append((x, y))
+    return positions
+
+# Grid positions along a line between two tiles using Bresenham's algorithm, so there are no gaps or doubled corners,
+# e.g. line_path((0, 0), (4, 2)) == [(0, 0), (1, 0), (2, 1), (3, 1), (4, 2)]
+def line_path(start, end):
+    x, y = start
+    dx = abs(end[0] - x)
+    dy = -abs(end[1] - y)
+    step_x = 1 if end[0] > x else -1
+    step_y = 1 if end[1] > y else -1
+    error = dx + dy
+    positions = [(x, y)]
+    while (x, y) != tuple(end):
+        # Both steps are decided from the error before either is applied
+        e2 = error * 2
+        if e2 >= dy:
+            error += dy
+            x += step_x
+        if e2 < dx:
+            error += dx
+            y += step_y
+        positions.append((x, y))
+    return positions
+
+# Copy the ongrid tiles inside a rectangle, stored relative to its top left tile. Empty tiles are not copied so pasting does not erase.
+def copy_region(tilemap, start, end):
+    left = min(start[0], end[0])
+    top = min(start[1], end[1])
+    region = {}
+    for tile_pos in rect_area(start, end):
+        state = tilemap.tile_state(tile_pos)
+        if state:
+            region[(tile_pos[0] - left, tile_pos[1] - top)] = state
+    return region
+
+# Undo/redo stacks of compact tilemap deltas: {grid position: (old, new)} where old and new are (type, variant) pairs or None
+class EditHistory:
+    def __init__(self, limit=MAX_HISTORY):
+        self.limit = limit
+        self.undo_stack = []
+        self.redo_stack = []
+        # Delta being built by a brush stroke that spans several frames
+        self.current = None
+
+    def begin(self):
+        if self.current is None:
+            self.current = {}
+
+    # Merge a delta into the open edit, keeping the first old state and the last new state of each tile
+    def record(self, delta):
+        # Edits made outside of a stroke become their own undo step
+        single = self.current is None
+        self.begin()
+        for tile_pos, (old, new) in delta.items():
+            if tile_pos in self.current:
+                old = self.current[tile_pos][0]
+            self.current[tile_pos] = (old, new)
+        if single:
+            self.end()
+
+    def end(self):
+        if self.current is None:
+            return
+        # Tiles changed and changed back within one stroke are not worth keeping
+        delta = {tile_pos: change for tile_pos, change in self.current.items() if change[0] != change[1]}
+        self.current = None
+        if delta:
+            self.undo_stack.append(delta)
+            if len(self.undo_stack) > self.limit:
+                self.undo_stack.pop(0)
+            self.redo_stack = []
+
+    def undo(self, tilemap):
+        self.end()
+        if self.undo_stack:
+            delta = self.undo_stack.pop()
+            tilemap.apply({tile_pos: old for tile_pos, (old, new) in delta.items()})
+            self.redo_stack.append(delta)
+
+    def redo(self, tilemap):
+        self.end()
+        if self.redo_stack:
+            delta = self.redo_stack.pop()
+            tilemap.apply({tile_pos: new for tile_pos, (old, new) in delta.items()})
+            self.undo_stack.append(delta)
@@ -0,0 +1,71 @@
+import random
+
+# Size in pixels of the spatial grid cells emitters are bucketed into
+EMITTER_CELL_SIZE = 128
+# Emitters this many pixels outside the camera still spawn, so particles drift in from off-screen naturally
+ACTIVE_MARGIN = 64
+# Most particles alive at once from a single emitter
+PARTICLE_BUDGET = 6
+
+# A particle source covering a Rect area. Spawns on average `rate` particles per frame while active.
+class Emitter:
+    def __init__(self, rect, rate, budget=PARTICLE_BUDGET):
+        self.rect = rect
+        self.rate = rate
+        self.budget = budget
+        # Particles from this emitter that are still alive
+        self.live = 0
+        # Frame of the next spawn, pre-sampled from the Poisson process
+        self.next_spawn = 0
+        # Last frame the emitter was near the camera, to notice when it becomes active again
+        self.active_frame = -1
+
+# Spawns particles only from emitters near the camera. Emitters are kept in a spatial grid so finding them costs the same no matter how many the level has.
+# Spawn times are drawn from exponential intervals, the continuous version of rolling a spawn chance every frame, so idle frames cost nothing.
+class EmitterSystem:
+    def __init__(self, game, emitters, spawn):
+        self.game = game
+        self.emitters = emitters
+        # Called with an emitter, returns a new particle somewhere in its area
+        self.spawn = spawn
+        self.frame = 0
+        self.grid = {}
+        for emitter in emitters:
+            for cell in self.cells(emitter.rect):
+                self.grid.setdefault(cell, []).append(emitter)
+
+    def cells(self, rect):
+        for x in range(rect.left // EMITTER_CELL_SIZE, (rect.right - 1) // EMITTER_CELL_SIZE + 1):
+            for y in range(rect.top // EMITTER_CELL_SIZE, (rect.bottom - 1) // EMITTER_CELL_SIZE + 1):
+                yield (x, y)
+
+    # Emitters overlapping the camera view plus the active margin
+    def active(self, view):
+        area = view.inflate(ACTIVE_MARGIN * 2, ACTIVE_MARGIN * 2)
+        found = []
+        for cell in self.cells(area):
+            for emitter in self.grid.get(cell, ()):
+                if emitter.active_frame != self.frame and emitter.rect.colliderect(area):
+                    # Coming back into view, so schedule from now instead of catching up on the frames spent inactive
+                    if emitter.active_frame != self.frame - 1:
+                        emitter.next_spawn = self.frame + random.expovariate(emitter.rate)
+                    emitter.active_frame = self.frame
+                    found.append(emitter)
+        return found
+
+    def update(self, view):
+        self.frame += 1
+        for emitter in self.active(view):
+            while emitter.next_spawn <= self.frame:
+                emitter.next_spawn += random.expovariate(emitter.rate)
+                if emitter.live < emitter.budget:
+                    particle = self.spawn(emitter)
+                    particle.emitter = emitter
+                    emitter.live += 1
+                    self.game.particles.append(particle)
+
+    # Called when a particle from an emitter is removed
+    def release(self, particle):
+        if particle.emitter:
+            particle.emitter.live -= 1
+            particle.emitter = None
@@ -38,9 +38,9 @@ class PhysicsEntity:
         frame_movement = (movement[0] + self.velocity[0], movement[1] + self.velocity[1])
         # Update player X position
         self.pos[0] += frame_movement[0]
-        # Collision checking with tilemap for physics in X axis
+        # Collision checking with tilemap for physics in X axis, against the merged colliders overlapping the entity
         entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
+        for rect in tilemap.physics_rects_near(entity_rect):
             if entity_rect.colliderect(rect):
                 # If player is moving right, snap player's rect position right edge back to the collided tile's left edge
                 if frame_movement[0] > 0:
@@ -56,7 +56,7 @@ class PhysicsEntity:
         self.pos[1] += frame_movement[1]
         # Collision checking with tilemap for physics in Y axis
         entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
+        for rect in tilemap.physics_rects_near(entity_rect):
             if entity_rect.colliderect(rect):
                 # If player is moving right, snap player's rect position right edge back to the collided tile's left edge
                 if frame_movement[1] > 0:
@@ -97,15 +97,14 @@ class Enemy(PhysicsEntity):
 
     def update(self, tilemap, movement=(0, 0)):
         if self.walking:
-            # Scans out in facing direction 7 pixels horizontally and 23 pixels down in ground. Checks if physics tile exists or whether it is a ledge.
-            if tilemap.solid_check((self.rect().centerx + (-7 if self.flip else 7), self.pos[1] + 23)):
-                # Check if there is a wall blocking the way, flip entity around if it is.
-                if (self.collisions['right'] or self.collisions['left']):
-                    self.flip = not self.flip
-                else:
-                    # If flipped direction, subtract 0.5 from X movement input, else set to 0.5. Keep Y same.
-                    movement = (movement[0] - 0.5 if self.flip else 0.5, movement[1])
-            # If physics tile was not found, flip entity around.
+            # Look up the precomputed walkable span in the ground 23 pixels down, and check that 7 pixels ahead in facing direction is still on it.
+            # Spans end at both ledges and walls, so the entity turns around before walking off an edge or into a wall.
+            span = tilemap.nav.span_at((self.rect().centerx, self.pos[1] + 23))
+            ahead = self.rect().centerx + (-7 if self.flip else 7)
+            if span and span['left'] <= ahead < span['right']:
+                # If flipped direction, subtract 0.5 from X movement input, else set to 0.5. Keep Y same.
+                movement = (movement[0] - 0.5 if self.flip else 0.5, movement[1])
+            # If the span ends ahead, flip entity around.
             else:
                 self.flip = not self.flip
             self.walking = max(0, self.walking - 1)     # Normalizes walking timer down to 0 over time
@@ -113,10 +112,11 @@ class Enemy(PhysicsEntity):
             if not self.walking:
                 # Distance between enemy and player position
                 dis = (self.game.player.pos[0] - self.pos[0], self.game.player.pos[1] - self.pos[1])
-                if (abs(dis[1]) < 16 and abs(dis[0]) < 180):
+                # Only shoot when no wall stands between enemy and player on the enemy's platform
+                if (abs(dis[1]) < 16 and abs(dis[0]) < 180 and span and tilemap.nav.in_sight(span, self.game.player.rect().centerx)):
                     # If looking left and player is on the left side
                     if (self.flip and dis[0] < 0):
-                        self.game.sfx['shoot'].play()
+                        self.game.sfx.play('shoot')
                         self.game.projectiles.append([[self.rect().centerx - 7, self.rect().centery], -1.5, 0])
                         # Spawn sparks to the left when shooting projectile from gun
                         for i in range(4):
@@ -141,7 +141,7 @@ class Enemy(PhysicsEntity):
         # If player collides with enemy while dashing, kill enemy. Else if player collides with enemy, kill player and restart map.   
         if self.rect().colliderect(self.game.player.rect()) and not self.game.dead:
             self.game.screenshake = max(16, self.game.screenshake)
-            self.game.sfx['hit'].play()
+            self.game.sfx.play('hit')
             for i in range(30):
                 angle = random.random() * math.pi * 2
                 speed = random.random() * 5
@@ -276,7 +276,7 @@ class Player(PhysicsEntity):
     def dash(self):
         # Tracks how much in velocity to dash and in which direction on X axis
         if not self.dashing:
-            self.game.sfx['dash'].play()
+            self.game.sfx.play('dash')
             if self.flip:
                 self.dashing = -60
             else:
@@ -0,0 +1,68 @@
+import math
+import random
+from scripts.tilemap import Tilemap
+
+# Offgrid decoration placed on top of platforms, as (type, variant) pairs. Trees are ('large_decor', 2) and placed separately since they spawn leaves.
+DECOR_TILES = [('decor', 0), ('decor', 1), ('decor', 2), ('decor', 3), ('large_decor', 0), ('large_decor', 1)]
+# Rows between platform layers, enough headroom to jump between them
+LAYER_SPACING = 5
+# Platform length and thickness ranges in tiles
+PLATFORM_LENGTH = (4, 16)
+PLATFORM_THICKNESS = (1, 3)
+# Game.update kills the player below 2.5 display heights, 600 pixels, so every platform must end above it
+KILL_PLANE = 600
+
+# Build a random level in the map JSON format, for stress testing. Platforms of grass and stone are laid in layers until the level has about `tiles` solid tiles,
+# then the player, `enemies` enemies, `trees` trees and decoration covering a `decor` fraction of the walkable tiles are placed on top of them.
+def generate_level(tiles=400, decor=0.1, trees=4, enemies=4, tile_size=16, seed=0):
+    rng = random.Random(seed)
+    # Keep the level about four times wider than it is tall as it grows
+    width = max(24, int(math.sqrt(tiles * 8)))
+    layers = max(2, width // 4 // LAYER_SPACING)
+    # Past the layers that fit above the kill plane the level only grows wider, keeping the same tiles per layer and column
+    max_layers = (KILL_PLANE // tile_size - PLATFORM_THICKNESS[1]) // LAYER_SPACING
+    if layers > max_layers:
+        width = width * layers // max_layers
+        layers = max_layers
+
+    tilemap = {}
+
+    def add_platform(x, y, length, thickness, tile_type):
+        for i in range(length):
+            for j in range(thickness):
+                tilemap[str(x + i) + ';' + str(y + j)] = {'type': tile_type, 'variant': 0, 'pos': [x + i, y + j]}
+
+    # Walkable tiles, with open space above
+    def walkable():
+        return sorted(tile['pos'] for tile in tilemap.values() if str(tile['pos'][0]) + ';' + str(tile['pos'][1] - 1) not in tilemap)
+
+    # Tiles enemies can be placed on. The starting platform is kept clear for the player.
+    def open_walkable():
+        return [pos for pos in walkable() if pos[0] >= 8 or pos[1] != LAYER_SPACING]
+
+    # Starting platform for the player. Small tile counts are already covered by it, so platforms keep being laid until there is room for the enemies too.
+    add_platform(0, LAYER_SPACING, 8, 2, 'grass')
+    while len(tilemap) < tiles or (enemies and not open_walkable()):
+        length = rng.randint(*PLATFORM_LENGTH)
+        add_platform(rng.randrange(width), rng.randrange(1, layers + 1) * LAYER_SPACING, length, rng.randint(*PLATFORM_THICKNESS), rng.choice(['grass', 'stone']))
+
+    level = Tilemap(None, tile_size)
+    level.tilemap = tilemap
+    level.autotile()
+
+    surface = walkable()
+    open_surface = open_walkable()
+
+    offgrid = [{'type': 'spawners', 'variant': 0, 'pos': [2 * tile_size, LAYER_SPACING * tile_size - 16]}]
+    for i in range(enemies):
+        pos = rng.choice(open_surface)
+        offgrid.append({'type': 'spawners', 'variant': 1, 'pos': [pos[0] * tile_size + 4, pos[1] * tile_size - 16]})
+    for i in range(trees):
+        pos = rng.choice(surface)
+        offgrid.append({'type': 'large_decor', 'variant': 2, 'pos': [pos[0] * tile_size - 8, pos[1] * tile_size - 40]})
+    for i in range(int(len(surface) * decor)):
+        pos = rng.choice(surface)
+        tile_type, variant = rng.choice(DECOR_TILES)
+        offgrid.append({'type': tile_type, 'variant': variant, 'pos': [pos[0] * tile_size + rng.random() * 8, pos[1] * tile_size - 16]})
+
+    return {'tilemap': tilemap, 'tile_size': tile_size, 'offgrid': offgrid}
@@ -0,0 +1,131 @@
+import os
+import gc
+import sys
+import json
+import tracemalloc
+import pygame
+from scripts.utils import Animation, ASSET_PACK
+
+# Frames between memory samples, one minute at 60 fps
+DEFAULT_INTERVAL = 3600
+# Source lines listed per sample, by growth since the previous sample
+TOP_GROWTH = 10
+# Call stack depth recorded per allocation. One frame is enough to attribute growth to a source line.
+TRACE_DEPTH = 1
+
+# Bytes of pixel memory held by all distinct Surfaces reachable from an asset dict, list or Animation.
+# Surfaces sharing the asset pack's pixels are left out since the mapping is counted on its own.
+def surface_bytes(obj, seen=None):
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pygame.Surface):
+        if ASSET_PACK and obj in ASSET_PACK.surfaces:
+            return 0
+        return obj.get_pitch() * obj.get_height()
+    if isinstance(obj, Animation):
+        return surface_bytes(obj.images, seen)
+    if isinstance(obj, dict):
+        return sum(surface_bytes(value, seen) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(surface_bytes(value, seen) for value in obj)
+    return 0
+
+# Live objects of the game's classes, counted by the garbage collector, so objects leaking outside the game's own lists are found too
+def class_counts(names):
+    counts = dict.fromkeys(names, 0)
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        if name in counts:
+            counts[name] += 1
+    return counts
+
+# Opt-in memory accounting for long sessions. Every `interval` frames it records live object counts per subsystem, surface and audio memory,
+# and the source lines whose allocations grew most since the last sample, as one JSON line appended to `out`.
+class MemoryMonitor:
+    def __init__(self, interval=DEFAULT_INTERVAL, out='memory.jsonl', top=TOP_GROWTH):
+        self.interval = interval
+        self.out = out
+        self.top = top
+        self.game = None
+        self.frames = 0
+        self.snapshot = None
+
+    def start(self, game):
+        self.game = game
+        self.frames = 0
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_DEPTH)
+        self.snapshot = self.take_snapshot()
+        self.record()
+
+    # Called once at the end of every frame
+    def frame(self):
+        self.frames += 1
+        if self.interval and self.frames % self.interval == 0:
+            self.record()
+
+    def take_snapshot(self):
+        # Leave out tracemalloc's own bookkeeping
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    # Counts of the objects each subsystem holds
+    def object_counts(self):
+        game = self.game
+        counts = {
+            'enemies': len(game.enemies),
+            'projectiles': len(game.projectiles),
+            'particles': len(game.particles),
+            'sparks': len(game.sparks),
+            'tiles': len(game.tilemap.tilemap),
+            'offgrid_tiles': len(game.tilemap.offgrid_tiles),
+            'colliders': game.tilemap.collision.count(),
+            'emitters': len(game.leaf_spawners.emitters),
+            'navs': len(game.navs),
+            'queued_draws': len(game.display_queue.commands) + len(game.display_2_queue.commands)
+        }
+        counts['live'] = class_counts(['Particle', 'Spark', 'Enemy', 'Player', 'Animation', 'Tilemap', 'EmitterSystem', 'Emitter'])
+        return counts
+
+    # Bytes held in surfaces, mixer sounds and the asset pack mapping
+    def cache_bytes(self):
+        game = self.game
+        return {
+            'asset_surfaces': surface_bytes(game.assets),
+            'display_surfaces': surface_bytes([game.screen, game.display, game.display_2]),
+            'audio_decoded': game.sfx.stats()['decoded_bytes'],
+            'asset_pack_mapped': len(ASSET_PACK.data) if ASSET_PACK else 0
+        }
+
+    def record(self):
+        snapshot = self.take_snapshot()
+        growth = []
+        for stat in snapshot.compare_to(self.snapshot, 'lineno')[:self.top]:
+            frame = stat.traceback[0]
+            growth.append({'line': os.path.basename(frame.filename) + ':' + str(frame.lineno), 'size_diff': stat.size_diff, 'count_diff': stat.count_diff})
+        self.snapshot = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        sample = {'frame': self.frames, 'traced': current, 'traced_peak': peak, 'objects': self.object_counts(), 'caches': self.cache_bytes(), 'growth': growth}
+        f = open(self.out, 'a')
+        f.write(json.dumps(sample) + '\n')
+        f.close()
+        print('Memory at frame ' + str(self.frames) + ': ' + str(current // 1024) + ' KB traced, ' + str(peak // 1024) + ' KB peak', file=sys.stderr)
+        return sample
+
+    def stop(self):
+        if self.game:
+            self.record()
+            self.game = None
+
+# Command line flags for game.py. Each flag can also be set with an environment variable.
+def add_memory_args(parser):
+    parser.add_argument('--memory', action='store_true', default=bool(os.environ.get('NINJA_MEMORY')), help='record memory use and growth periodically (env NINJA_MEMORY)')
+    parser.add_argument('--memory-interval', type=int, default=int(os.environ.get('NINJA_MEMORY_INTERVAL', DEFAULT_INTERVAL)), help='frames between memory samples (env NINJA_MEMORY_INTERVAL)')
+    parser.add_argument('--memory-out', default=os.environ.get('NINJA_MEMORY_OUT', 'memory.jsonl'), help='file the samples are appended to as JSON lines (env NINJA_MEMORY_OUT)')
+
+def monitor_from_args(args):
+    if not args.memory:
+        return None
+    return MemoryMonitor(args.memory_interval, out=args.memory_out)
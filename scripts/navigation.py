@@ -0,0 +1,88 @@
+import os
+import json
+import hashlib
+from scripts.tilemap import PHYSICS_TILES
+from scripts.utils import save_json
+
+# Bump when the span format changes so old cache files are rebuilt
+NAV_VERSION = 2
+# Navigation data for data/maps/<id>.json is cached in data/maps/<id>.nav
+NAV_SUFFIX = '.nav'
+# How far enemies can see along their platform, in tiles. Covers the 180 pixel shooting range.
+SIGHT_RANGE = 12
+
+# Static level analysis used by enemy patrols. A span is a horizontal run of solid tiles with open space above, which entities can walk along.
+# Spans are dicts with pixel bounds 'left' and 'right', grid row 'y', whether each end is a 'ledge' or a 'wall', and the pixel band 'sight' that is clear of walls in the row above the span.
+class Navigation:
+    def __init__(self, tile_size, spans):
+        self.tile_size = tile_size
+        self.spans = spans
+        # Span containing each walkable grid position, for O(1) lookups
+        self.index = {}
+        for span in spans:
+            for x in range(span['left'] // tile_size, span['right'] // tile_size):
+                self.index[(x, span['y'])] = span
+
+    # Walkable span containing a pixel position, or None if there is no walkable ground there
+    def span_at(self, pos):
+        return self.index.get((int(pos[0] // self.tile_size), int(pos[1] // self.tile_size)))
+
+    # Whether a pixel x position is in the clear band above a span, i.e. not behind a wall
+    def in_sight(self, span, x):
+        return span['sight'][0] <= x < span['sight'][1]
+
+# Find all walkable spans of a tilemap, with their ends and sightlines
+def build_navigation(tilemap):
+    solid = set()
+    for tile in tilemap.tilemap.values():
+        if tile['type'] in PHYSICS_TILES:
+            solid.add((tile['pos'][0], tile['pos'][1]))
+    ts = tilemap.tile_size
+
+    spans = []
+    # Walk each row left to right, so every span is found from its leftmost tile
+    for (x, y) in sorted(solid, key=lambda tile_pos: (tile_pos[1], tile_pos[0])):
+        if (x, y - 1) in solid or ((x - 1, y) in solid and (x - 1, y - 1) not in solid):
+            continue
+        end = x
+        while (end + 1, y) in solid and (end + 1, y - 1) not in solid:
+            end += 1
+        # Scan the row above the span in both directions for the first wall within sight range
+        sight_left = x
+        while sight_left > x - SIGHT_RANGE and (sight_left - 1, y - 1) not in solid:
+            sight_left -= 1
+        sight_right = end
+        while sight_right < end + SIGHT_RANGE and (sight_right + 1, y - 1) not in solid:
+            sight_right += 1
+        spans.append({
+            'left': x * ts,
+            'right': (end + 1) * ts,
+            'y': y,
+            'left_edge': 'wall' if (x - 1, y - 1) in solid else 'ledge',
+            'right_edge': 'wall' if (end + 1, y - 1) in solid else 'ledge',
+            'sight': (sight_left * ts, (sight_right + 1) * ts)
+        })
+    return Navigation(ts, spans)
+
+# Navigation for a map, read from the cache file next to it if that is still up to date, otherwise built and cached.
+# The cache is keyed by a hash of the map data the tilemap was loaded from, so a map file saved after it was parsed can not pair stale data with a fresh cache.
+def load_navigation(map_path, tilemap, map_data):
+    nav_path = os.path.splitext(map_path)[0] + NAV_SUFFIX
+    source = hashlib.sha1(json.dumps(map_data, sort_keys=True).encode()).hexdigest()
+    try:
+        f = open(nav_path, 'r')
+        nav_data = json.load(f)
+        f.close()
+        if nav_data['version'] == NAV_VERSION and nav_data['source'] == source and nav_data['tile_size'] == tilemap.tile_size:
+            return Navigation(tilemap.tile_size, nav_data['spans'])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    nav = build_navigation(tilemap)
+    if os.path.exists(map_path):
+        try:
+            save_json(nav_path, {'version': NAV_VERSION, 'source': source, 'tile_size': tilemap.tile_size, 'spans': nav.spans})
+        except OSError:
+            # Read-only installs still work, the analysis is just redone on the next start
+            pass
+    return nav
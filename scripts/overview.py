@@ -0,0 +1,156 @@
+import math
+import pygame
+from scripts.tilemap import CHUNK_SIZE
+
+# Mipmap levels baked for every chunk, as divisors of the full size: 1/2, 1/4 and 1/8 scale
+LOD_DIVISORS = [2, 4, 8]
+# Most chunks baked per frame, so zooming out over a large map for the first time spreads the work over several frames
+BAKES_PER_FRAME = 8
+# Zoom range of the overview and the zoom factor of one mouse wheel step
+MIN_ZOOM = 1 / 16
+MAX_ZOOM = 1 / 2
+ZOOM_STEP = 2 ** 0.25
+OVERVIEW_ZOOM = 1 / 4
+
+# Downscaled images of the map, one set of mipmaps per chunk. A chunk is baked again only after tilemap.chunk_revisions shows it was edited.
+# Offgrid tiles are bucketed by their top left corner and can reach into the chunks right and below, so a chunk also depends on the chunks left and above it.
+class ChunkLODs:
+    def __init__(self, tilemap, assets):
+        self.tilemap = tilemap
+        self.assets = assets
+        self.chunk_px = tilemap.tile_size * CHUNK_SIZE
+        # {chunk: (revisions it was baked at, [surface per LOD level] or None if empty)}
+        self.chunks = {}
+        self.budget = BAKES_PER_FRAME
+        # Number of bakes so far, so views built from the chunk images know when to rebuild
+        self.bakes = 0
+        # A surface to compose the view onto, reused while the display size and zoom level stay the same
+        self.canvas = None
+
+    def begin_frame(self):
+        self.budget = BAKES_PER_FRAME
+
+    # Revisions of a chunk and of the neighbors whose offgrid tiles can overlap it
+    def revisions(self, chunk):
+        revisions = self.tilemap.chunk_revisions
+        return (revisions.get(chunk, 0), revisions.get((chunk[0] - 1, chunk[1]), 0), revisions.get((chunk[0], chunk[1] - 1), 0), revisions.get((chunk[0] - 1, chunk[1] - 1), 0))
+
+    # Image of a chunk at an LOD level index, or None if it is empty. Stale images are still returned when this frame's bake budget is used up.
+    def image(self, chunk, level):
+        cached = self.chunks.get(chunk)
+        revisions = self.revisions(chunk)
+        if (not cached or cached[0] != revisions) and self.budget > 0:
+            self.budget -= 1
+            self.bakes += 1
+            cached = (revisions, self.bake(chunk))
+            self.chunks[chunk] = cached
+        if cached and cached[1]:
+            return cached[1][level]
+        return None
+
+    # Draw a chunk at full size the way Tilemap.render does, then scale it down one level at a time
+    def bake(self, chunk):
+        origin = (chunk[0] * self.chunk_px, chunk[1] * self.chunk_px)
+        full = pygame.Surface((self.chunk_px, self.chunk_px))
+        empty = True
+        for tile in self.tilemap.offgrid_tiles:
+            tile_chunk = self.tilemap.offgrid_chunk_of(tile['pos'])
+            if chunk[0] - 1 <= tile_chunk[0] <= chunk[0] and chunk[1] - 1 <= tile_chunk[1] <= chunk[1]:
+                full.blit(self.assets[tile['type']][tile['variant']], (tile['pos'][0] - origin[0], tile['pos'][1] - origin[1]))
+                empty = False
+        for x in range(chunk[0] * CHUNK_SIZE, (chunk[0] + 1) * CHUNK_SIZE):
+            for y in range(chunk[1] * CHUNK_SIZE, (chunk[1] + 1) * CHUNK_SIZE):
+                tile = self.tilemap.tilemap.get(str(x) + ';' + str(y))
+                if tile:
+                    full.blit(self.assets[tile['type']][tile['variant']], (x * self.tilemap.tile_size - origin[0], y * self.tilemap.tile_size - origin[1]))
+                    empty = False
+        if empty:
+            return None
+        levels = []
+        img = full
+        for divisor in LOD_DIVISORS:
+            img = pygame.transform.smoothscale(img, (self.chunk_px // divisor, self.chunk_px // divisor))
+            levels.append(img)
+        return levels
+
+    # LOD level index to draw a zoom with: the smallest level that is still at least as detailed as the zoom
+    def level_for(self, zoom):
+        for level, divisor in enumerate(LOD_DIVISORS):
+            if 1 / divisor / 2 < zoom:
+                return level
+        return len(LOD_DIVISORS) - 1
+
+    # Draw the map around a world pixel position at a zoom. Chunks are composed at the nearest LOD level, then the composed view is scaled once to the zoom,
+    # so the cost per frame depends on the display size, not on the map size or zoom.
+    def render(self, surf, center, zoom):
+        level = self.level_for(zoom)
+        scale = 1 / LOD_DIVISORS[level]
+        size = (math.ceil(surf.get_width() * scale / zoom), math.ceil(surf.get_height() * scale / zoom))
+        if not self.canvas or self.canvas.get_size() != size:
+            self.canvas = pygame.Surface(size)
+        self.canvas.fill((0, 0, 0))
+
+        left = center[0] - surf.get_width() / 2 / zoom
+        top = center[1] - surf.get_height() / 2 / zoom
+        right = left + surf.get_width() / zoom
+        bottom = top + surf.get_height() / zoom
+        for cx in range(math.floor(left / self.chunk_px), math.floor(right / self.chunk_px) + 1):
+            for cy in range(math.floor(top / self.chunk_px), math.floor(bottom / self.chunk_px) + 1):
+                img = self.image((cx, cy), level)
+                if img:
+                    self.canvas.blit(img, ((cx * self.chunk_px - left) * scale, (cy * self.chunk_px - top) * scale))
+        surf.blit(pygame.transform.scale(self.canvas, surf.get_size()), (0, 0))
+
+# Whole map at the smallest LOD level, fitted into a Rect of the display. Rebuilt only after chunk images change.
+class Minimap:
+    def __init__(self, lods, rect):
+        self.lods = lods
+        self.rect = rect
+        tilemap = lods.tilemap
+        # Chunks that hold tiles. Edited chunks are added as they show up in the revisions.
+        self.map_chunks = set(tilemap.chunk_of(tile['pos']) for tile in tilemap.tilemap.values())
+        self.map_chunks.update(tilemap.offgrid_chunk_of(tile['pos']) for tile in tilemap.offgrid_tiles)
+        self.surface = None
+        self.built_at = None
+        # World pixel position of the minimap's top left corner, and minimap pixels per world pixel
+        self.origin = (0, 0)
+        self.scale = 1
+
+    def update(self):
+        self.map_chunks.update(self.lods.tilemap.chunk_revisions)
+        level = len(LOD_DIVISORS) - 1
+        for chunk in self.map_chunks:
+            self.lods.image(chunk, level)
+        if self.built_at == self.lods.bakes or not self.map_chunks:
+            return
+        self.built_at = self.lods.bakes
+
+        left = min(chunk[0] for chunk in self.map_chunks)
+        top = min(chunk[1] for chunk in self.map_chunks)
+        width = max(chunk[0] for chunk in self.map_chunks) - left + 1
+        height = max(chunk[1] for chunk in self.map_chunks) - top + 1
+        cell = self.lods.chunk_px // LOD_DIVISORS[level]
+        full = pygame.Surface((width * cell, height * cell))
+        for chunk in self.map_chunks:
+            img = self.lods.image(chunk, level)
+            if img:
+                full.blit(img, ((chunk[0] - left) * cell, (chunk[1] - top) * cell))
+        # Fit the map into the Rect keeping its aspect ratio
+        fit = min(self.rect.width / full.get_width(), self.rect.height / full.get_height())
+        self.surface = pygame.transform.smoothscale(full, (max(1, int(full.get_width() * fit)), max(1, int(full.get_height() * fit))))
+        self.origin = (left * self.lods.chunk_px, top * self.lods.chunk_px)
+        self.scale = fit * cell / self.lods.chunk_px
+
+    # Draw the minimap with an outline of the world pixel Rect currently in view
+    def render(self, surf, view):
+        self.update()
+        pygame.draw.rect(surf, (0, 0, 0), self.rect)
+        if self.surface:
+            surf.blit(self.surface, self.rect.topleft)
+        view_r = pygame.Rect(self.rect.x + (view.x - self.origin[0]) * self.scale, self.rect.y + (view.y - self.origin[1]) * self.scale, max(1, view.width * self.scale), max(1, view.height * self.scale))
+        pygame.draw.rect(surf, (255, 255, 255), view_r.clip(self.rect), 1)
+        pygame.draw.rect(surf, (90, 90, 90), self.rect, 1)
+
+    # World pixel position under a display position inside the minimap
+    def world_pos(self, pos):
+        return (self.origin[0] + (pos[0] - self.rect.x) / self.scale, self.origin[1] + (pos[1] - self.rect.y) / self.scale)
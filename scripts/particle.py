@@ -6,6 +6,8 @@ class Particle:
         self.velocity = list(velocity)
         self.animation = self.game.assets['particle/' + p_type].copy()
         self.animation.frame = frame
+        # Emitter that spawned the particle, if any, so it can track how many of its particles are alive
+        self.emitter = None
         
     def update(self):
         kill = False
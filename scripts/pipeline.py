@@ -0,0 +1,38 @@
+import threading
+
+# Hands per-tick render snapshots from the simulation thread to the render thread.
+# Snapshots are new objects every tick and never modified afterwards, so publishing one is a reference swap under a lock. At most three are alive at once:
+# the one being drawn, the newest finished one, and the one being recorded, which is the triple buffering the two threads need to never wait on each other.
+class SnapshotBuffer:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.snapshot = None
+        # Number of snapshots published so far, the tick of the newest one
+        self.tick = 0
+        # Snapshots replaced before the renderer took them
+        self.dropped = 0
+        self.taken = 0
+        # Exception that stopped the simulation thread, raised again on the render thread
+        self.error = None
+
+    def publish(self, snapshot):
+        with self.condition:
+            if self.tick > self.taken:
+                self.dropped += 1
+            self.snapshot = snapshot
+            self.tick += 1
+            self.condition.notify()
+
+    def fail(self, error):
+        with self.condition:
+            self.error = error
+            self.condition.notify()
+
+    # Newest snapshot as (tick, snapshot). Waits up to timeout seconds for one newer than last_tick, then returns the newest there is, which may be None before the first tick.
+    def latest(self, last_tick, timeout=None):
+        with self.condition:
+            self.condition.wait_for(lambda: self.tick > last_tick or self.error, timeout)
+            if self.error:
+                raise self.error
+            self.taken = self.tick
+            return self.tick, self.snapshot
@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+# Profiling modes: cProfile traces every call, sample periodically grabs the main thread stack from a background thread.
+# Threads whose target is wrapped with Profiler.wrap are profiled too, under a root named after the thread.
+PROFILE_MODES = ('cprofile', 'sample')
+# Number of frames profiled before the session stops, writes its output and quits
+DEFAULT_FRAMES = 600
+# Seconds between stack samples in sample mode
+SAMPLE_INTERVAL = 0.001
+# Stop walking up the call stack after this many functions when expanding cProfile call graphs
+MAX_STACK_DEPTH = 64
+
+# Readable name for a function in a collapsed stack line. Semicolons and spaces are separators in the flamegraph format.
+def frame_label(filename, lineno, funcname):
+    label = funcname + ' (' + os.path.basename(filename) + ':' + str(lineno) + ')'
+    return label.replace(';', ':').replace(' ', '_')
+
+# Labels for a frame and everything that called it, root first as expected by the collapsed stack format
+def stack_labels(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(frame_label(code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+class Profiler:
+    def __init__(self, mode='sample', frames=DEFAULT_FRAMES, out='profile', interval=SAMPLE_INTERVAL):
+        if mode not in PROFILE_MODES:
+            raise ValueError('Unknown profile mode: ' + str(mode))
+        self.mode = mode
+        self.max_frames = frames
+        # Output path without extension. Writes <out>.folded for flamegraph tools, and <out>.prof for pstats in cProfile mode.
+        self.out = out
+        self.interval = interval
+        self.frames = 0
+        self.running = False
+        self.profile = None
+        self.samples = Counter()
+        self.sampler = None
+        self.target_thread = None
+        # Wrapped threads being sampled, {thread ident: root label}, and the cProfile profiles of wrapped threads that have finished, as (root label, profile)
+        self.threads = {}
+        self.thread_profiles = []
+        # Stack of the code that started profiling. cProfile never sees these frames return, so they are prepended to its stacks.
+        self.root = ()
+        self.started = 0
+        self.seconds = 0
+        # Totals of per-frame counters reported by the game, e.g. draw calls
+        self.counters = Counter()
+        # Last and highest values of levels reported by the game, e.g. memory held by a cache, which would be meaningless summed over frames
+        self.gauges = {}
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.frames = 0
+        self.counters = Counter()
+        self.gauges = {}
+        self.threads = {}
+        self.thread_profiles = []
+        self.started = time.perf_counter()
+        if self.mode == 'cprofile':
+            self.root = stack_labels(sys._getframe(1))
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            # Sample the thread that started profiling, which is the thread running the game loop
+            self.target_thread = threading.get_ident()
+            self.sampler = threading.Thread(target=self.sample_loop, name='profiler-sampler', daemon=True)
+            self.sampler.start()
+
+    # Called once at the end of every frame. Returns True when the frame budget is used up.
+    def frame(self):
+        self.frames += 1
+        return bool(self.max_frames) and self.frames >= self.max_frames
+
+    # Add to a named counter. Totals and per-frame averages are written to <out>.counters.json when profiling stops.
+    def count(self, name, value):
+        self.counters[name] += value
+
+    # Report the current value of a named level. The last and highest values are written to <out>.counters.json when profiling stops.
+    def gauge(self, name, value):
+        peak = self.gauges[name]['max'] if name in self.gauges else value
+        self.gauges[name] = {'last': value, 'max': max(peak, value)}
+
+    # Wrap the target of a thread started while profiling, so the work moved off the main thread shows up in the output as well
+    def wrap(self, target):
+        def run():
+            if not self.running:
+                return target()
+            thread = threading.current_thread()
+            root = ('thread:' + thread.name).replace(';', ':').replace(' ', '_')
+            if self.mode == 'cprofile':
+                # cProfile only sees the thread that enabled it, so each thread gets its own profile
+                profile = cProfile.Profile()
+                profile.enable()
+                try:
+                    return target()
+                finally:
+                    profile.disable()
+                    self.thread_profiles.append((root, profile))
+            self.threads[thread.ident] = root
+            try:
+                return target()
+            finally:
+                del self.threads[thread.ident]
+        return run
+
+    def sample_loop(self):
+        while self.running:
+            frames = sys._current_frames()
+            stack = stack_labels(frames.get(self.target_thread))
+            if stack:
+                self.samples[stack] += 1
+            for ident, root in list(self.threads.items()):
+                stack = stack_labels(frames.get(ident))
+                if stack:
+                    self.samples[(root,) + stack] += 1
+            time.sleep(self.interval)
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.seconds = time.perf_counter() - self.started
+        if self.mode == 'cprofile':
+            self.profile.disable()
+            # Wrapped threads have finished by now, since the game joins them before stopping the profiler
+            profiles = [profile for root, profile in self.thread_profiles]
+            pstats.Stats(self.profile, *profiles).dump_stats(self.out + '.prof')
+            stacks = self.cprofile_stacks(self.profile, self.root)
+            for root, profile in self.thread_profiles:
+                stacks.update(self.cprofile_stacks(profile, (root,)))
+            self.write_folded(stacks)
+        else:
+            self.sampler.join()
+            self.write_folded(self.samples)
+        if self.counters or self.gauges:
+            self.write_counters()
+        print('Profiled ' + str(self.frames) + ' frames, wrote ' + self.out + '.folded', file=sys.stderr)
+
+    # Expand the cProfile caller graph into approximate full stacks. Each function's own time is split between its callers in proportion to the time spent under each caller.
+    def cprofile_stacks(self, profile, root):
+        stats = pstats.Stats(profile).stats
+        stacks = Counter()
+
+        def walk(func, weight, path):
+            callers = stats[func][4] if func in stats else {}
+            callers = {caller: timing for caller, timing in callers.items() if caller not in path}
+            total = sum(timing[3] for timing in callers.values())
+            if not callers or not total or len(path) >= MAX_STACK_DEPTH:
+                stacks[root + tuple(frame_label(*f) for f in reversed(path))] += weight
+                return
+            for caller, timing in callers.items():
+                walk(caller, weight * timing[3] / total, path + (caller,))
+
+        for func, (cc, nc, tt, ct, callers) in stats.items():
+            if tt > 0:
+                walk(func, tt, (func,))
+        # Collapsed stack counts are integers, so report microseconds
+        return Counter({stack: int(weight * 1000000) for stack, weight in stacks.items() if int(weight * 1000000)})
+
+    def write_folded(self, stacks):
+        f = open(self.out + '.folded', 'w')
+        for stack, count in sorted(stacks.items()):
+            f.write(';'.join(stack) + ' ' + str(count) + '\n')
+        f.close()
+
+    def write_counters(self):
+        counters = {}
+        for name, total in sorted(self.counters.items()):
+            counters[name] = {'total': total, 'per_frame': total / max(1, self.frames)}
+        f = open(self.out + '.counters.json', 'w')
+        json.dump({'frames': self.frames, 'seconds': self.seconds, 'fps': self.frames / max(self.seconds, 1e-9), 'counters': counters, 'gauges': dict(sorted(self.gauges.items()))}, f, indent=2)
+        f.close()
+
+# Command line flags shared by game.py and editor.py. Each flag can also be set with an environment variable.
+def add_profile_args(parser):
+    parser.add_argument('--profile', choices=PROFILE_MODES, default=os.environ.get('NINJA_PROFILE'), help='profile the main loop with cProfile or a stack sampler (env NINJA_PROFILE)')
+    parser.add_argument('--profile-frames', type=int, default=int(os.environ.get('NINJA_PROFILE_FRAMES', DEFAULT_FRAMES)), help='number of frames to profile before quitting, 0 to profile until the window is closed (env NINJA_PROFILE_FRAMES)')
+    parser.add_argument('--profile-out', default=os.environ.get('NINJA_PROFILE_OUT', 'profile'), help='output path without extension (env NINJA_PROFILE_OUT)')
+    parser.add_argument('--headless', action='store_true', default=bool(os.environ.get('NINJA_HEADLESS')), help='run without a window or sound device using the dummy SDL drivers (env NINJA_HEADLESS)')
+
+# Must run before pygame.init() so SDL picks up the dummy drivers
+def setup_headless(args):
+    if args.headless:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+def profiler_from_args(args):
+    if not args.profile:
+        return None
+    return Profiler(args.profile, frames=args.profile_frames, out=args.profile_out)
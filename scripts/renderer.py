@@ -0,0 +1,67 @@
+# Draw order of queued sprites, lowest first
+LAYER_CLOUDS = 0
+LAYER_TILES = 1
+LAYER_ENTITIES = 2
+LAYER_PROJECTILES = 3
+LAYER_PARTICLES = 4
+
+# Collects blits for a target surface during a frame and submits them in batches. Has the blit and size methods the render functions use,
+# so it can be passed anywhere a surface is expected. Commands are culled against the target and submitted with one Surface.blits call per layer.
+class RenderQueue:
+    def __init__(self, target):
+        self.target = target
+        # Layer that blits are currently queued into
+        self.layer = 0
+        self.commands = []
+        # Counters since the last reset, for instrumentation
+        self.stats = {'commands': 0, 'culled': 0, 'draw_calls': 0}
+
+    def get_width(self):
+        return self.target.get_width()
+
+    def get_height(self):
+        return self.target.get_height()
+
+    def get_size(self):
+        return self.target.get_size()
+
+    def blit(self, source, dest):
+        self.commands.append((self.layer, source, dest))
+
+    # Hand over the queued commands and start an empty queue, e.g. to submit them later from another thread
+    def take(self):
+        commands = self.commands
+        self.commands = []
+        return commands
+
+    # Submit queued commands, or a list returned by take, in layer order and in the order they were queued within a layer.
+    # Sprites within a layer overlap (e.g. decor under ground tiles), so they are not regrouped by texture.
+    def flush(self, commands=None):
+        if commands is None:
+            commands = self.take()
+        # Allow a pixel of slack since destinations are truncated to whole pixels when blitting
+        view = self.target.get_rect().inflate(2, 2)
+        # Stable sort keeps queue order within each layer
+        commands.sort(key=lambda command: command[0])
+        self.stats['commands'] += len(commands)
+        batch = []
+        batch_layer = None
+        for layer, source, dest in commands:
+            if not view.colliderect((dest[0], dest[1], source.get_width(), source.get_height())):
+                self.stats['culled'] += 1
+                continue
+            if layer != batch_layer and batch:
+                self.submit(batch)
+                batch = []
+            batch_layer = layer
+            batch.append((source, dest))
+        if batch:
+            self.submit(batch)
+
+    def submit(self, batch):
+        self.target.blits(batch, doreturn=False)
+        self.stats['draw_calls'] += 1
+
+    def reset_stats(self):
+        for key in self.stats:
+            self.stats[key] = 0
@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+from scripts.utils import save_json
+
+# Seconds between autosaves of changed chunks in the editor, 0 disables autosave
+AUTOSAVE_INTERVAL = 30
+# Autosaved chunks of <map>.json are stored as one file per chunk in <map>.json.autosave/
+AUTOSAVE_SUFFIX = '.autosave'
+
+# Saves maps on a background thread so the editor keeps rendering while JSON is serialized and written.
+# The tilemap is snapshotted on the calling thread, so later edits never race with the write.
+class MapSaver:
+    def __init__(self, autosave_interval=AUTOSAVE_INTERVAL):
+        self.autosave_interval = autosave_interval
+        self.last_autosave = time.time()
+        # Chunk revisions already written to disk, either in a full save or an autosave
+        self.saved_revisions = {}
+        # Snapshot time of each autosaved chunk file, so a full save can clean up the ones it supersedes
+        self.autosave_times = {}
+        self.jobs = queue.Queue()
+        self.worker = threading.Thread(target=self.work, name='map-saver', daemon=True)
+        self.worker.start()
+
+    # Queue a full save of the map
+    def save(self, tilemap, path):
+        self.saved_revisions = dict(tilemap.chunk_revisions)
+        self.jobs.put(('save', path, tilemap.snapshot(), time.time()))
+
+    # Called every frame. Once per interval, queues the chunks edited since they were last written.
+    def autosave(self, tilemap, path):
+        now = time.time()
+        if not self.autosave_interval or now - self.last_autosave < self.autosave_interval:
+            return
+        self.last_autosave = now
+        dirty = [chunk for chunk, revision in tilemap.chunk_revisions.items() if self.saved_revisions.get(chunk) != revision]
+        if dirty:
+            for chunk in dirty:
+                self.saved_revisions[chunk] = tilemap.chunk_revisions[chunk]
+            self.jobs.put(('autosave', path, tilemap.snapshot_chunks(dirty), now))
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+            kind, path, data, snapshot_time = job
+            try:
+                if kind == 'save':
+                    save_json(path, data)
+                    self.clear_autosaves(path, snapshot_time)
+                else:
+                    self.write_chunks(path, data, snapshot_time)
+            except OSError as e:
+                print('Saving ' + path + ' failed: ' + str(e), file=sys.stderr)
+            self.jobs.task_done()
+
+    def write_chunks(self, path, chunk_data, snapshot_time):
+        directory = path + AUTOSAVE_SUFFIX
+        os.makedirs(directory, exist_ok=True)
+        for chunk, data in chunk_data.items():
+            chunk_path = os.path.join(directory, str(chunk[0]) + ';' + str(chunk[1]) + '.json')
+            save_json(chunk_path, {'chunk': chunk, 'time': snapshot_time, 'tilemap': data['tilemap'], 'offgrid': data['offgrid']})
+            self.autosave_times[chunk_path] = snapshot_time
+
+    # Remove autosaved chunks that are older than a completed full save
+    def clear_autosaves(self, path, snapshot_time):
+        for chunk_path, chunk_time in list(self.autosave_times.items()):
+            if chunk_time <= snapshot_time:
+                if os.path.exists(chunk_path):
+                    os.remove(chunk_path)
+                del self.autosave_times[chunk_path]
+
+    # Apply autosaved chunks that are newer than the map file, e.g. after the editor crashed. Returns the number of chunks recovered.
+    def recover(self, tilemap, path):
+        directory = path + AUTOSAVE_SUFFIX
+        if not os.path.isdir(directory):
+            return 0
+        map_time = os.path.getmtime(path) if os.path.exists(path) else 0
+        recovered = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.json'):
+                continue
+            chunk_path = os.path.join(directory, name)
+            # Chunk files are always written after the save they follow, so a chunk newer than the map file holds unsaved edits
+            if os.path.getmtime(chunk_path) > map_time:
+                f = open(chunk_path, 'r')
+                data = json.load(f)
+                f.close()
+                tilemap.replace_chunk(tuple(data['chunk']), data)
+                self.autosave_times[chunk_path] = data['time']
+                recovered += 1
+            else:
+                os.remove(chunk_path)
+        return recovered
+
+    # Block until queued saves are written
+    def wait(self):
+        self.jobs.join()
+
+    def close(self):
+        self.jobs.put(None)
+        self.worker.join()
@@ -1,23 +1,40 @@
 import json
 import pygame
+from scripts.utils import save_json
+from scripts.collision import CollisionMesh
 
-# Rules used for AutoTiling. if % neighbor tiles exist, use tile variant: %. *List-sort so order does not matter. Cannot use List as a key, so need to make it a Tuple.*
+# Each AutoTiling neighbor direction sets its own bit in a neighbor mask, so rules can be looked up by integer instead of sorted tuples
+AUTOTILE_BITS = {(1, 0): 1, (-1, 0): 2, (0, -1): 4, (0, 1): 8}
+
+def neighbor_mask(shifts):
+    mask = 0
+    for shift in shifts:
+        mask |= AUTOTILE_BITS[shift]
+    return mask
+
+# Rules used for AutoTiling. if % neighbor tiles exist, use tile variant: %. Order does not matter since each neighbor is a bit in the mask.
 AUTOTILE_MAP = {
-    tuple(sorted([(1, 0), (0, 1)])): 0,
-    tuple(sorted([(1, 0), (0, 1), (-1, 0)])): 1,
-    tuple(sorted([(-1, 0), (0, 1)])): 2,
-    tuple(sorted([(-1, 0), (0, -1), (0, 1)])): 3,
-    tuple(sorted([(-1, 0), (0, -1)])): 4,
-    tuple(sorted([(-1, 0), (0, -1), (1, 0)])): 5,
-    tuple(sorted([(1, 0), (0, -1)])): 6,
-    tuple(sorted([(1, 0), (0, -1), (0, 1)])): 7,
-    tuple(sorted([(1, 0), (-1, 0), (0, 1), (0, -1)])): 8
+    neighbor_mask([(1, 0), (0, 1)]): 0,
+    neighbor_mask([(1, 0), (0, 1), (-1, 0)]): 1,
+    neighbor_mask([(-1, 0), (0, 1)]): 2,
+    neighbor_mask([(-1, 0), (0, -1), (0, 1)]): 3,
+    neighbor_mask([(-1, 0), (0, -1)]): 4,
+    neighbor_mask([(-1, 0), (0, -1), (1, 0)]): 5,
+    neighbor_mask([(1, 0), (0, -1)]): 6,
+    neighbor_mask([(1, 0), (0, -1), (0, 1)]): 7,
+    neighbor_mask([(1, 0), (-1, 0), (0, 1), (0, -1)]): 8
 }
+# Flat lookup table indexed by neighbor mask. None means no rule, so the tile keeps its variant.
+AUTOTILE_VARIANTS = [AUTOTILE_MAP.get(mask) for mask in range(16)]
 # To check collision with nearest 9 tiles around the player
 NEIGHBOR_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]
 # Tiles with physics enabled and collidable
 PHYSICS_TILES = {'grass', 'stone'}
 AUTOTILE_TYPES = {'grass', 'stone'}
+# Width and height of a map chunk in tiles. Edits are tracked per chunk so autosave only writes what changed.
+CHUNK_SIZE = 16
+# Largest region a flood fill may cover, so filling open space around a map cannot run away
+FLOOD_LIMIT = 65536
 
 class Tilemap:
     def __init__(self, game, tile_size=16):
@@ -25,6 +42,12 @@ class Tilemap:
         self.tile_size = tile_size
         self.tilemap = {}
         self.offgrid_tiles = []
+        # Edit counter per chunk, bumped whenever a tile inside the chunk changes
+        self.chunk_revisions = {}
+        # Walkable spans and sightlines of the level, set by the game after loading a map
+        self.nav = None
+        # Merged colliders for the physics tiles, kept up to date as tiles are edited
+        self.collision = CollisionMesh(tile_size, CHUNK_SIZE)
 
         # for i in range(10):
         #     # Horizontal line of grass tiles at pos X:(3 to 12), Y:10
@@ -64,20 +87,161 @@ class Tilemap:
                 tiles.append(self.tilemap[check_loc])
         return tiles
 
-    # Save tilemap function into Json file
+    # Type and variant of the ongrid tile at grid position, or None if empty
+    def tile_state(self, tile_pos):
+        tile = self.tilemap.get(str(tile_pos[0]) + ';' + str(tile_pos[1]))
+        if tile:
+            return (tile['type'], tile['variant'])
+
+    # Apply a batch of ongrid tile changes as one mutation. Changes map grid positions to (type, variant) pairs, or None to delete.
+    # Returns a compact delta of {grid position: (old, new)} for every tile that changed, including neighbors changed by AutoTiling, for undo/redo.
+    def apply(self, changes, autotile=False):
+        affected = set(changes)
+        if autotile:
+            for tile_pos in changes:
+                for shift in AUTOTILE_BITS:
+                    affected.add((tile_pos[0] + shift[0], tile_pos[1] + shift[1]))
+        before = {tile_pos: self.tile_state(tile_pos) for tile_pos in affected}
+
+        for tile_pos, state in changes.items():
+            old = before[tile_pos]
+            if old == state:
+                continue
+            # AutoTiled tiles only need to match in type since their variant is picked by neighbors
+            if autotile and state and old and old[0] == state[0] and state[0] in AUTOTILE_TYPES:
+                continue
+            loc = str(tile_pos[0]) + ';' + str(tile_pos[1])
+            if state:
+                self.tilemap[loc] = {'type': state[0], 'variant': state[1], 'pos': [tile_pos[0], tile_pos[1]]}
+            else:
+                del self.tilemap[loc]
+
+        if autotile:
+            for tile_pos in affected:
+                self.autotile_tile(tile_pos)
+
+        delta = {}
+        collision_chunks = set()
+        for tile_pos in affected:
+            after = self.tile_state(tile_pos)
+            if after != before[tile_pos]:
+                delta[tile_pos] = (before[tile_pos], after)
+                self.touch(self.chunk_of(tile_pos))
+                # Only tiles that gained or lost physics change the collision mesh, not variant changes
+                if (before[tile_pos] and before[tile_pos][0] in PHYSICS_TILES) != (after and after[0] in PHYSICS_TILES):
+                    collision_chunks.add(self.chunk_of(tile_pos))
+        for chunk in collision_chunks:
+            self.update_collision_chunk(chunk)
+        return delta
+
+    # Grid positions of every physics enabled tile
+    def solid_positions(self):
+        return [(tile['pos'][0], tile['pos'][1]) for tile in self.tilemap.values() if tile['type'] in PHYSICS_TILES]
+
+    def update_collision_chunk(self, chunk):
+        cells = set()
+        for x in range(chunk[0] * CHUNK_SIZE, (chunk[0] + 1) * CHUNK_SIZE):
+            for y in range(chunk[1] * CHUNK_SIZE, (chunk[1] + 1) * CHUNK_SIZE):
+                tile = self.tilemap.get(str(x) + ';' + str(y))
+                if tile and tile['type'] in PHYSICS_TILES:
+                    cells.add((x, y))
+        self.collision.update_chunk(chunk, cells)
+
+    # Chunk holding an ongrid tile at grid position
+    def chunk_of(self, tile_pos):
+        return (int(tile_pos[0] // CHUNK_SIZE), int(tile_pos[1] // CHUNK_SIZE))
+
+    # Chunk holding an offgrid tile at pixel position
+    def offgrid_chunk_of(self, pos):
+        return (int(pos[0] // (self.tile_size * CHUNK_SIZE)), int(pos[1] // (self.tile_size * CHUNK_SIZE)))
+
+    def touch(self, chunk):
+        self.chunk_revisions[chunk] = self.chunk_revisions.get(chunk, 0) + 1
+
+    def add_offgrid(self, tile):
+        self.offgrid_tiles.append(tile)
+        self.touch(self.offgrid_chunk_of(tile['pos']))
+
+    def remove_offgrid(self, tile):
+        self.offgrid_tiles.remove(tile)
+        self.touch(self.offgrid_chunk_of(tile['pos']))
+
+    # Copy of the map data that stays valid while the tilemap keeps being edited, e.g. for saving on another thread
+    def snapshot(self):
+        return {'tilemap': {loc: tile.copy() for loc, tile in self.tilemap.items()}, 'tile_size': self.tile_size, 'offgrid': [tile.copy() for tile in self.offgrid_tiles]}
+
+    # Copies of the ongrid and offgrid tiles in each of the given chunks, as {chunk: {'tilemap': {...}, 'offgrid': [...]}}
+    def snapshot_chunks(self, chunks):
+        chunk_data = {chunk: {'tilemap': {}, 'offgrid': []} for chunk in chunks}
+        for loc, tile in self.tilemap.items():
+            chunk = self.chunk_of(tile['pos'])
+            if chunk in chunk_data:
+                chunk_data[chunk]['tilemap'][loc] = tile.copy()
+        for tile in self.offgrid_tiles:
+            chunk = self.offgrid_chunk_of(tile['pos'])
+            if chunk in chunk_data:
+                chunk_data[chunk]['offgrid'].append(tile.copy())
+        return chunk_data
+
+    # Swap the whole contents of a chunk for previously snapshotted data, e.g. when recovering an autosave
+    def replace_chunk(self, chunk, data):
+        for loc in [loc for loc, tile in self.tilemap.items() if self.chunk_of(tile['pos']) == chunk]:
+            del self.tilemap[loc]
+        self.offgrid_tiles = [tile for tile in self.offgrid_tiles if self.offgrid_chunk_of(tile['pos']) != chunk]
+        self.tilemap.update(data['tilemap'])
+        self.offgrid_tiles.extend(data['offgrid'])
+        self.touch(chunk)
+        self.update_collision_chunk(chunk)
+
+    # Grid positions connected to tile_pos holding the same tile type, or connected empty space. Empty regions are bounded by the map extent plus a one tile margin.
+    # Returns None for regions larger than limit, rather than whatever part of the region the search had reached.
+    def flood_region(self, tile_pos, limit=FLOOD_LIMIT):
+        target = self.tile_state(tile_pos)
+        target_type = target[0] if target else None
+        if self.tilemap:
+            xs = [tile['pos'][0] for tile in self.tilemap.values()]
+            ys = [tile['pos'][1] for tile in self.tilemap.values()]
+            bounds = (min(xs) - 1, min(ys) - 1, max(xs) + 1, max(ys) + 1)
+        else:
+            bounds = (tile_pos[0], tile_pos[1], tile_pos[0], tile_pos[1])
+        if not (bounds[0] <= tile_pos[0] <= bounds[2] and bounds[1] <= tile_pos[1] <= bounds[3]):
+            return []
+
+        region = {tuple(tile_pos)}
+        stack = [tuple(tile_pos)]
+        while stack:
+            x, y = stack.pop()
+            for shift in AUTOTILE_BITS:
+                check_pos = (x + shift[0], y + shift[1])
+                if check_pos in region or not (bounds[0] <= check_pos[0] <= bounds[2] and bounds[1] <= check_pos[1] <= bounds[3]):
+                    continue
+                tile = self.tilemap.get(str(check_pos[0]) + ';' + str(check_pos[1]))
+                if (tile['type'] if tile else None) == target_type:
+                    region.add(check_pos)
+                    if len(region) > limit:
+                        return None
+                    stack.append(check_pos)
+        return list(region)
+
+    # Save tilemap function into Json file. Written atomically so an interrupted save keeps the previous file intact.
     def save(self, path):
-        f = open(path, 'w')  
-        json.dump({'tilemap': self.tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles}, f)
-        f.close()
+        save_json(path, {'tilemap': self.tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles})
 
     # Load map from Json file
     def load(self, path):
         f = open(path, 'r')
         map_data = json.load(f)
         f.close()
-        self.tilemap = map_data['tilemap']
+        self.load_data(map_data)
+
+    # Load map from already parsed map data. Only the containers are copied, so the same data can be loaded again or shared by several tilemaps as long as tiles are not edited in place.
+    def load_data(self, map_data):
+        self.tilemap = dict(map_data['tilemap'])
         self.tile_size = map_data['tile_size']
-        self.offgrid_tiles = map_data['offgrid']
+        self.offgrid_tiles = list(map_data['offgrid'])
+        self.chunk_revisions = {}
+        self.collision = CollisionMesh(self.tile_size, CHUNK_SIZE)
+        self.collision.build(self.solid_positions())
 
     # Checks for solid tile at location for enemy patrolling logic
     def solid_check(self, pos):
@@ -87,6 +251,10 @@ class Tilemap:
             if self.tilemap[tile_loc]['type'] in PHYSICS_TILES:
                 return self.tilemap[tile_loc]
 
+    # Merged colliders of physics enabled tiles overlapping an entity's Rect
+    def physics_rects_near(self, rect):
+        return self.collision.rects_in(rect)
+
     # Check nearby tiles if they are physics enabled and collidable
     def physics_rects_around(self, pos):
         rects = []
@@ -95,22 +263,40 @@ class Tilemap:
                 rects.append(pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size, self.tile_size))
         return rects
 
-    # AutoTiling for ongrid tiles and their neighbors using map editor
+    # AutoTiling for all ongrid tiles in one pass. Builds a grid of tile types keyed by position once, then each tile needs four grid lookups and one table lookup.
+    # Returns a delta of {grid position: (old, new)} for every tile whose variant changed, like apply does, so the pass can be undone.
     def autotile(self):
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            neighbors = set()
-            # For every neighbor tile around a specific tile being checked
-            for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
-                check_loc = str(tile['pos'][0] + shift[0]) + ';' + str(tile['pos'][1] + shift[1])
-                # If neighbor tile exists
-                if check_loc in self.tilemap:
-                    # Only AutoTile if same type (not variant)
-                    if self.tilemap[check_loc]['type'] == tile['type']:
-                        neighbors.add(shift)
-            neighbors = tuple(sorted(neighbors))
-            if (tile['type'] in AUTOTILE_TYPES) and (neighbors in AUTOTILE_MAP):
-                tile['variant'] = AUTOTILE_MAP[neighbors]
+        grid = {}
+        delta = {}
+        for tile in self.tilemap.values():
+            if tile['type'] in AUTOTILE_TYPES:
+                grid[(tile['pos'][0], tile['pos'][1])] = tile
+        for (x, y), tile in grid.items():
+            tile_type = tile['type']
+            mask = 0
+            # Only AutoTile if same type (not variant)
+            for shift, bit in AUTOTILE_BITS.items():
+                neighbor = grid.get((x + shift[0], y + shift[1]))
+                if neighbor and neighbor['type'] == tile_type:
+                    mask |= bit
+            if AUTOTILE_VARIANTS[mask] is not None and tile['variant'] != AUTOTILE_VARIANTS[mask]:
+                delta[(x, y)] = ((tile_type, tile['variant']), (tile_type, AUTOTILE_VARIANTS[mask]))
+                tile['variant'] = AUTOTILE_VARIANTS[mask]
+                self.touch(self.chunk_of((x, y)))
+        return delta
+
+    # AutoTiling for a single ongrid tile at grid position, if it exists
+    def autotile_tile(self, tile_pos):
+        tile = self.tilemap.get(str(tile_pos[0]) + ';' + str(tile_pos[1]))
+        if not tile or tile['type'] not in AUTOTILE_TYPES:
+            return
+        mask = 0
+        for shift, bit in AUTOTILE_BITS.items():
+            neighbor = self.tilemap.get(str(tile_pos[0] + shift[0]) + ';' + str(tile_pos[1] + shift[1]))
+            if neighbor and neighbor['type'] == tile['type']:
+                mask |= bit
+        if AUTOTILE_VARIANTS[mask] is not None:
+            tile['variant'] = AUTOTILE_VARIANTS[mask]
 
     def render(self, surf, offset=(0, 0)):
         # Store tiles offgrid as grid positions
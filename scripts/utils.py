@@ -1,20 +1,82 @@
 import os
+import json
+import tempfile
 import pygame
+from scripts.assetpack import open_pack
 
 BASE_IMG_PATH = 'data/images/'
+BASE_MAP_PATH = 'data/maps/'
+# Single file pack of everything under data/, built with build_assets.py. Assets missing from it, or changed since it was built, are read from the loose files.
+ASSET_PACK_PATH = 'data/assets.pak'
+ASSET_PACK = open_pack(ASSET_PACK_PATH)
 
 def load_image(path):
+    entry = ASSET_PACK and ASSET_PACK.entry('images', path)
+    if entry:
+        # Shares the packed pixels instead of decoding and converting the PNG
+        return ASSET_PACK.image(entry)
     img = pygame.image.load(BASE_IMG_PATH + path).convert()
     img.set_colorkey((0, 0, 0))
     return img
 
 def load_images(path):
     images = []
-    # For all files in path. For OS compatibility, sorted() ensures that linux file system sorts files alphabetically like windows.
-    for img_name in sorted(os.listdir(BASE_IMG_PATH + path)):
+    if ASSET_PACK and path in ASSET_PACK.index['dirs']:
+        img_names = set(ASSET_PACK.index['dirs'][path])
+        # Loose files added since the pack was built are loaded too
+        if os.path.isdir(BASE_IMG_PATH + path):
+            img_names.update(os.listdir(BASE_IMG_PATH + path))
+    else:
+        # Raises FileNotFoundError right away for a directory that is neither packed nor on disk
+        img_names = os.listdir(BASE_IMG_PATH + path)
+    # For OS compatibility, sorted() ensures that linux file system sorts files alphabetically like windows.
+    img_names = sorted(img_names)
+    for img_name in img_names:
         images.append(load_image(path + '/' + img_name))
     return images
 
+# Parse every level map once. Maps are numbered 0.json, 1.json, ... in the order they are played.
+def load_maps():
+    maps = []
+    # Count the loose maps when they exist, so maps added since the pack was built are played too
+    if ASSET_PACK and not os.path.isdir(BASE_MAP_PATH):
+        map_count = len(ASSET_PACK.index['maps'])
+    else:
+        map_count = len([name for name in os.listdir(BASE_MAP_PATH) if name.endswith('.json')])
+    for map_id in range(map_count):
+        f = open_asset(BASE_MAP_PATH + str(map_id) + '.json', map_id=map_id)
+        maps.append(json.load(f))
+        f.close()
+    return maps
+
+# Binary file object for a data file, from the asset pack if it is packed there. Maps are looked up in the pack by map_id.
+def open_asset(path, map_id=None):
+    if ASSET_PACK:
+        if map_id is None:
+            entry = ASSET_PACK.entry('files', path)
+        else:
+            entry = ASSET_PACK.entry('maps', map_id)
+        if entry:
+            return ASSET_PACK.open(entry)
+    return open(path, 'rb')
+
+# Write JSON to a temporary file next to the target and rename it over the target, so a crash mid-write never leaves a truncated file
+def save_json(path, data):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
 class Animation:
     def __init__(self, images, img_dur=5, loop=True):
         self.images = images
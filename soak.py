@@ -0,0 +1,68 @@
+import gc
+import sys
+import random
+import argparse
+import tracemalloc
+import pygame
+from game import Game, init_headless
+from benchmark import drive
+from scripts.memory import MemoryMonitor, TRACE_DEPTH
+
+# Memory still traced after a soak may exceed the memory traced after warming up by at most this many KB
+DEFAULT_BUDGET_KB = 256
+
+# Play one level for a number of frames with random input, rendering every frame, then reload the next level as a death or level change would
+def cycle(game, monitor, rng, frames):
+    for i in range(frames):
+        drive(game, rng)
+        game.update()
+        game.render()
+        monitor.frame()
+    game.map = (game.map + 1) % len(game.maps)
+    game.load_map(game.map)
+
+# Snapshot of the traced memory once garbage has been collected
+def settled_snapshot(monitor):
+    gc.collect()
+    return monitor.take_snapshot()
+
+def snapshot_size(snapshot):
+    return sum(stat.size for stat in snapshot.statistics('filename'))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play the game headless through many level loads and fail if memory keeps growing')
+    parser.add_argument('--cycles', type=int, default=100, help='level loads to run after warming up')
+    parser.add_argument('--warmup', type=int, default=10, help='level loads to run before the baseline is taken, so caches fill first')
+    parser.add_argument('--frames', type=int, default=120, help='frames played per level load')
+    parser.add_argument('--budget-kb', type=int, default=DEFAULT_BUDGET_KB, help='allowed growth of traced memory over the soak')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='soak.jsonl', help='memory samples, one JSON line per sample')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rng = random.Random(args.seed)
+    tracemalloc.start(TRACE_DEPTH)
+    assets, sfx = init_headless()
+    game = Game(assets=assets, sfx=sfx)
+    # Record a sample every 10 level loads
+    monitor = MemoryMonitor(interval=args.frames * 10, out=args.out)
+    monitor.start(game)
+
+    for i in range(args.warmup):
+        cycle(game, monitor, rng, args.frames)
+    baseline = settled_snapshot(monitor)
+
+    for i in range(args.cycles):
+        cycle(game, monitor, rng, args.frames)
+    final = settled_snapshot(monitor)
+    monitor.stop()
+    growth = snapshot_size(final) - snapshot_size(baseline)
+
+    print('Grew ' + str(growth // 1024) + ' KB over ' + str(args.cycles) + ' level loads, budget ' + str(args.budget_kb) + ' KB')
+    if growth > args.budget_kb * 1024:
+        print('Memory budget exceeded. Largest growth since warming up:')
+        for stat in final.compare_to(baseline, 'lineno')[:10]:
+            print('  ' + str(stat))
+        pygame.quit()
+        sys.exit(1)
+    pygame.quit()
@@ -0,0 +1,171 @@
+import os
+import time
+import random
+import argparse
+import multiprocessing
+from multiprocessing import shared_memory
+from scripts.utils import load_maps
+
+# Observation of one game instance, stored as one float64 per field in shared memory
+OBS_FIELDS = ['player_x', 'player_y', 'velocity_x', 'velocity_y', 'dashing', 'air_time', 'dead', 'enemies', 'map', 'enemy_dx', 'enemy_dy', 'projectiles']
+OBS_SIZE = len(OBS_FIELDS)
+# Action of one game instance is a byte of input bits
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_JUMP = 4
+ACTION_DASH = 8
+
+# Write the observation of a game into a float64 buffer at the instance's slot
+def observe(game, obs, index):
+    player = game.player
+    # Relative position of the closest enemy, or 0 if the level is cleared
+    enemy_dx, enemy_dy = 0, 0
+    if game.enemies:
+        enemy = min(game.enemies, key=lambda e: abs(e.pos[0] - player.pos[0]) + abs(e.pos[1] - player.pos[1]))
+        enemy_dx, enemy_dy = enemy.pos[0] - player.pos[0], enemy.pos[1] - player.pos[1]
+    values = (player.pos[0], player.pos[1], player.velocity[0], player.velocity[1], player.dashing, player.air_time, game.dead, len(game.enemies), game.map, enemy_dx, enemy_dy, len(game.projectiles))
+    offset = index * OBS_SIZE
+    for i in range(OBS_SIZE):
+        obs[offset + i] = float(values[i])
+
+# Same effect as the keyboard input handled in Game.handle_events
+def apply_action(game, action):
+    game.movement[0] = bool(action & ACTION_LEFT)
+    game.movement[1] = bool(action & ACTION_RIGHT)
+    if action & ACTION_JUMP:
+        game.player.jump()
+    if action & ACTION_DASH:
+        game.player.dash()
+
+# Runs a share of the game instances in a worker process. Assets are loaded once per process and shared by all of its instances, and every instance shares the maps parsed by the parent.
+def worker(conn, indices, buffer_names, maps, seed):
+    from game import Game, init_headless
+
+    random.seed(seed)
+    assets, sfx = init_headless()
+
+    buffers = [shared_memory.SharedMemory(name=name) for name in buffer_names]
+    obs = buffers[0].buf.cast('d')
+    actions = buffers[1].buf
+    rewards = buffers[2].buf.cast('d')
+    dones = buffers[3].buf
+
+    games = {}
+    while True:
+        command = conn.recv()
+        if command == 'reset':
+            for index in indices:
+                games[index] = Game(assets=assets, sfx=sfx, maps=maps)
+                observe(games[index], obs, index)
+        elif command == 'step':
+            for index in indices:
+                game = games[index]
+                enemies = len(game.enemies)
+                was_dead = game.dead
+                level = game.map
+                apply_action(game, actions[index])
+                game.update()
+                # Reward killing enemies and punish dying. An episode ends whenever the level restarts or advances.
+                rewards[index] = float(max(0, enemies - len(game.enemies)) - (1 if game.dead and not was_dead else 0))
+                dones[index] = int((was_dead and not game.dead) or game.map != level or len(game.enemies) > enemies)
+                observe(game, obs, index)
+        elif command == 'close':
+            break
+        conn.send(command)
+
+    # Views must be released before the shared memory can be closed
+    obs.release()
+    actions.release()
+    rewards.release()
+    dones.release()
+    for buffer in buffers:
+        buffer.close()
+    conn.send('close')
+
+# Steps many independent headless Game instances in parallel worker processes.
+# Observations, actions, rewards and done flags live in shared memory, so a step only sends a short command to each worker.
+class VecEnv:
+    def __init__(self, num_envs, workers=None, seed=0):
+        self.num_envs = num_envs
+        self.num_workers = max(1, min(workers or os.cpu_count() or 1, num_envs))
+        # Parse the maps once here, workers receive them when they start instead of reading the files themselves
+        maps = load_maps()
+
+        self.buffers = [
+            shared_memory.SharedMemory(create=True, size=num_envs * OBS_SIZE * 8),
+            shared_memory.SharedMemory(create=True, size=num_envs),
+            shared_memory.SharedMemory(create=True, size=num_envs * 8),
+            shared_memory.SharedMemory(create=True, size=num_envs),
+        ]
+        self.obs = self.buffers[0].buf.cast('d')
+        self.actions = self.buffers[1].buf
+        self.rewards = self.buffers[2].buf.cast('d')
+        self.dones = self.buffers[3].buf
+
+        self.conns = []
+        self.processes = []
+        for w in range(self.num_workers):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            indices = list(range(w, num_envs, self.num_workers))
+            process = multiprocessing.Process(target=worker, args=(child_conn, indices, [buffer.name for buffer in self.buffers], maps, seed + w), daemon=True)
+            process.start()
+            self.conns.append(parent_conn)
+            self.processes.append(process)
+
+    def command(self, command):
+        for conn in self.conns:
+            conn.send(command)
+        for conn in self.conns:
+            conn.recv()
+
+    # Start every instance on the first level. Returns the observation buffer, OBS_SIZE floats per instance.
+    def reset(self):
+        self.command('reset')
+        return self.obs
+
+    # Step every instance once with a sequence of action bytes, one per instance
+    def step(self, actions):
+        self.actions[:] = bytes(actions)
+        self.command('step')
+        return self.obs, self.rewards, self.dones
+
+    # Observation of one instance as a dict of field name to value
+    def observation(self, index):
+        return dict(zip(OBS_FIELDS, self.obs[index * OBS_SIZE:(index + 1) * OBS_SIZE].tolist()))
+
+    def close(self):
+        self.command('close')
+        for process in self.processes:
+            process.join()
+        self.obs.release()
+        self.actions.release()
+        self.rewards.release()
+        self.dones.release()
+        for buffer in self.buffers:
+            buffer.close()
+            buffer.unlink()
+
+# Aggregate environment steps per second across all instances, stepping with random inputs
+def measure(num_envs, workers, steps, seed=0):
+    env = VecEnv(num_envs, workers=workers, seed=seed)
+    env.reset()
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    for i in range(steps):
+        env.step([rng.randrange(16) for i in range(num_envs)])
+    elapsed = time.perf_counter() - start
+    env.close()
+    return num_envs * steps / elapsed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure how headless Game simulation throughput scales across worker processes')
+    parser.add_argument('--envs', type=int, default=16, help='number of game instances')
+    parser.add_argument('--steps', type=int, default=300, help='steps per instance for each measurement')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1], help='worker process counts to compare')
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        rate = measure(args.envs, workers, args.steps)
+        baseline = baseline or rate
+        print('workers=' + str(workers) + ' envs=' + str(args.envs) + ' steps/sec=' + str(round(rate)) + ' speedup=' + str(round(rate / baseline, 2)) + 'x')